@@ -0,0 +1,138 @@
+import re
+from collections import Counter
+
+# Full UK postcode, allowing for missing or extra spaces between outward and inward code
+POSTCODE_PATTERN = re.compile(r'\b[A-Z]{1,2}[0-9][A-Z0-9]?\s*[0-9][A-Z]{2}\b', re.IGNORECASE)
+
+# A row that holds nothing but a country code, e.g. "GB" on its own line
+COUNTRY_ROW_PATTERN = re.compile(r'^\W*[A-Za-z]{2,3}\W*$')
+
+# Rows made of dashes or similar, used in some files to separate records
+SEPARATOR_ROW_PATTERN = re.compile(r'^\s*[-=_*]{3,}\s*$')
+
+# Words that mark the first row of a file as a column header rather than an address
+HEADER_KEYWORDS = ("name", "street", "address", "town", "city", "postcode", "country")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def is_header_row(row):
+    """True for a column header such as 'FirstName,LastName,StreetName,...'."""
+    lowered = row.lower()
+    return not any(char.isdigit() for char in row) and any(keyword in lowered for keyword in HEADER_KEYWORDS)
+
+
+def is_record_boundary(rows, i):
+    """
+    True if a record most likely ends after rows[i]: a separator row, or the row holding the
+    postcode (unless the country code follows on its own row), or that trailing country row.
+    """
+    row = rows[i]
+    next_row = rows[i + 1] if i + 1 < len(rows) else ""
+    if SEPARATOR_ROW_PATTERN.match(row):
+        return True
+    if POSTCODE_PATTERN.search(row):
+        return not COUNTRY_ROW_PATTERN.match(next_row)
+    return bool(COUNTRY_ROW_PATTERN.match(row)) and i > 0 and bool(POSTCODE_PATTERN.search(rows[i - 1]))
+
+
+class RowChunk(list):
+    """A chunk of rows; carried_rows are the leading rows repeated from the previous chunk after a forced cut."""
+
+    def __init__(self, rows, carried_rows=()):
+        super().__init__(rows)
+        self.carried_rows = list(carried_rows)
+
+
+def chunk_rows(rows, max_tokens=1500, overlap_rows=2):
+    """
+    Lazily group CSV rows into chunks of roughly max_tokens, cutting at the last likely record
+    boundary so addresses are not split across chunks. When no boundary is found the chunk is cut
+    where it is and its last overlap_rows rows are repeated at the start of the next chunk, so the
+    split record is seen whole once; duplicates this produces are removed by dedupe_chunk_edges.
+    A header row is repeated in every chunk.
+
+    Yields RowChunk lists of rows, whose carried_rows tell which leading rows were repeated.
+    """
+    header = None
+    pending = []
+    pending_tokens = 0
+    carried = []
+
+    for row in rows:
+        if header is None and not pending and is_header_row(row):
+            header = row
+            continue
+
+        pending.append(row)
+        pending_tokens += estimate_tokens(row)
+        if pending_tokens < max_tokens:
+            continue
+
+        # Cut after the last boundary in the chunk (the final row is skipped, the next row decides it)
+        cut = None
+        for i in range(len(pending) - 2, -1, -1):
+            if is_record_boundary(pending, i):
+                cut = i + 1
+                break
+
+        if cut is None:
+            cut = len(pending)
+            next_carried = pending[-overlap_rows:] if overlap_rows else []
+        else:
+            next_carried = []
+
+        # A boundary cut can fall inside the rows carried into this chunk
+        yield RowChunk(([header] if header else []) + pending[:cut], carried[:cut])
+        pending = next_carried + pending[cut:]
+        carried = next_carried
+        pending_tokens = sum(estimate_tokens(row) for row in pending)
+
+    if pending:
+        yield RowChunk(([header] if header else []) + pending, carried)
+
+
+def address_key(address):
+    """Normalized form of a separated address, used to spot the same address on both sides of a chunk edge."""
+    return re.sub(r'[\W_]+', '', address).lower()
+
+
+def from_rows(address, rows):
+    """True if a separated address holds the content of any of the rows."""
+    key = address_key(address)
+    return any(row_key and row_key in key for row_key in (address_key(row) for row in rows))
+
+
+def dedupe_chunk_edges(chunks):
+    """
+    Drop the addresses a chunk repeats from the end of the previous chunk because of its carried rows.
+    Takes (RowChunk, separated addresses) pairs and yields the separated addresses to keep.
+
+    Only chunks with carried rows (a forced cut) are deduplicated, and only their leading addresses
+    built from those rows that the previous chunk also produced from them as its last addresses (at
+    most one per carried row), one for one, so the same person appearing in several real records is
+    never dropped.
+    """
+    previous_addresses = []
+    for chunk, addresses in chunks:
+        carried_rows = getattr(chunk, "carried_rows", [])
+        skip = 0
+        if carried_rows:
+            # The carried rows end the previous chunk, so their addresses are its last ones
+            carried_addresses = []
+            for address in reversed(previous_addresses):
+                if len(carried_addresses) == len(carried_rows) or not from_rows(address, carried_rows):
+                    break
+                carried_addresses.append(address)
+            repeated = Counter(address_key(address) for address in carried_addresses)
+            for address in addresses:
+                key = address_key(address)
+                if not repeated[key] or not from_rows(address, carried_rows):
+                    break
+                repeated[key] -= 1
+                skip += 1
+        previous_addresses = addresses
+        yield addresses[skip:]
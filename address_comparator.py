@@ -1,70 +1,469 @@
 import json
+import threading
+from collections import Counter, defaultdict
 from fuzzywuzzy import fuzz
 
+# Fields the matcher scores, in the order of exact_key
+SCORED_FIELDS = ["FirstName", "LastName", "StreetName", "Town", "Postcode"]
+
+
+def normalize_postcode(postcode):
+    """Normalize a postcode for comparison (remove spaces, lowercase)."""
+    return postcode.replace(" ", "").lower() if postcode else ""
+
+
+def normalize_record(addr):
+    """The scored fields of an address as they are compared: lowercased, postcode without spaces."""
+    return {
+        "FirstName": addr['FirstName'].lower(),
+        "LastName": addr['LastName'].lower(),
+        "StreetName": addr['StreetName'].lower(),
+        "Town": addr['Town'].lower(),
+        "Postcode": normalize_postcode(addr['Postcode'])
+    }
+
+
+def field_scores(processed, truth, postcode_score=None):
+    """fuzz.ratio of each scored field of two normalized records; pass postcode_score if it is known already."""
+    return {
+        "FirstName": fuzz.ratio(processed['FirstName'], truth['FirstName']),
+        "LastName": fuzz.ratio(processed['LastName'], truth['LastName']),
+        "StreetName": fuzz.ratio(processed['StreetName'], truth['StreetName']),
+        "Town": fuzz.ratio(processed['Town'], truth['Town']),
+        "Postcode": fuzz.ratio(processed['Postcode'], truth['Postcode']) if postcode_score is None else postcode_score
+    }
+
+
+def weighted_total(scores):
+    """Weighted match score from the field scores of field_scores."""
+    return (scores['Postcode'] * 3 + scores['LastName'] * 2 + scores['FirstName'] + scores['StreetName'] + scores['Town']) / 8
+
+
+def normalized_score(processed, truth):
+    """weighted_score of two records already passed through normalize_record."""
+    scores = field_scores(processed, truth)
+    return weighted_total(scores), scores['Postcode']
+
+
+def weighted_score(processed_addr, truth_addr):
+    """
+    Weighted match score of a processed address against a ground truth record, and its postcode score.
+    Postcodes are weighted heavily (x3), last names x2, first name, street and town x1.
+    """
+    return normalized_score(normalize_record(processed_addr), normalize_record(truth_addr))
+
+
+def exact_key(normalized):
+    """
+    Key of a normalized record for the exact-match pass. Equal strings, empty ones included,
+    score 100 with fuzz.ratio, so records with equal keys always score 100.
+    """
+    return tuple(normalized[field] for field in SCORED_FIELDS)
+
+
+def truth_normalizer(ground_truth):
+    """
+    Function returning the normalized record of a ground truth index. A GroundTruthStore keeps
+    its fields normalized already; a plain list is normalized on the fly.
+    """
+    normalized = getattr(ground_truth, "normalized", None)
+    if normalized is not None:
+        return normalized
+    return lambda idx: normalize_record(ground_truth[idx])
+
+
+def outward_code(postcode):
+    """Return the outward part of a UK postcode, e.g. 'w1a' for 'W1A 1AA'."""
+    normalized = normalize_postcode(postcode)
+    # The inward code is always the last three characters (digit + two letters)
+    return normalized[:-3] if len(normalized) > 3 else normalized
+
+
+def inward_code(postcode):
+    """Return the inward part of a UK postcode, e.g. '1aa' for 'W1A 1AA', or '' if there is none."""
+    normalized = normalize_postcode(postcode)
+    return normalized[-3:] if len(normalized) > 3 else ""
+
+
+def ngrams(text, n=3):
+    """Return the set of character n-grams of a lowercased, space-padded string."""
+    text = f" {text.lower().strip()} " if text else ""
+    if not text.strip():
+        return set()
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class ComparatorIndex:
+    """
+    Blocking index over the ground truth, built once per ground truth list.
+
+    Candidates for a processed address are the records sharing its exact normalized
+    postcode, its outward code or its inward code, plus the records sharing the most
+    n-grams on last name and street. Only these candidates get the full weighted scoring.
+    A typo in either half of a postcode still leaves the other half to block on, so such
+    addresses are found even when their name and street are garbled or empty.
+
+    ngram_size: The n-gram length used for last name and street blocking.
+    max_ngram_candidates: How many of the best n-gram candidates to keep per address.
+    max_bucket_size: N-grams shared by more records than this are too common to be useful and are skipped.
+
+    A GroundTruthStore persists these buckets, so for a store built with the same ngram_size
+    nothing is built in memory and candidates are read from the mapped file.
+    """
+
+    def __init__(self, ground_truth, ngram_size=3, max_ngram_candidates=50, max_bucket_size=5000):
+        self.ground_truth = ground_truth
+        self.ngram_size = ngram_size
+        self.max_ngram_candidates = max_ngram_candidates
+        self.max_bucket_size = max_bucket_size
+
+        if getattr(ground_truth, "ngram_size", None) == ngram_size:
+            self.store = ground_truth
+            return
+        self.store = None
+        self.buckets = defaultdict(list)
+        normalized = truth_normalizer(ground_truth)
+        for idx in range(len(ground_truth)):
+            truth_addr = normalized(idx)
+            self.buckets[("postcode", truth_addr['Postcode'])].append(idx)
+            self.buckets[("outward", outward_code(truth_addr['Postcode']))].append(idx)
+            if inward_code(truth_addr['Postcode']):
+                self.buckets[("inward", inward_code(truth_addr['Postcode']))].append(idx)
+            for key in self._ngram_keys(truth_addr):
+                self.buckets[key].append(idx)
+
+    def bucket(self, name, key):
+        """Indices of the records in one bucket, from the store or the in-memory buckets."""
+        if self.store is not None:
+            return self.store.bucket(name, key)
+        return self.buckets.get((name, key), ())
+
+    def _ngram_keys(self, addr):
+        """Blocking keys for an address: n-grams tagged with the field they came from."""
+        keys = {("ngram:LastName", gram) for gram in ngrams(addr['LastName'], self.ngram_size)}
+        keys.update(("ngram:StreetName", gram) for gram in ngrams(addr['StreetName'], self.ngram_size))
+        return keys
+
+    def candidates(self, processed_addr):
+        """Return the sorted ground truth indices worth scoring for processed_addr."""
+        candidate_set = set(self.bucket("postcode", normalize_postcode(processed_addr['Postcode'])))
+        candidate_set.update(self.bucket("outward", outward_code(processed_addr['Postcode'])))
+        if inward_code(processed_addr['Postcode']):
+            candidate_set.update(self.bucket("inward", inward_code(processed_addr['Postcode'])))
+
+        shared_ngrams = Counter()
+        for key in self._ngram_keys(processed_addr):
+            bucket = self.bucket(*key)
+            if len(bucket) and len(bucket) <= self.max_bucket_size:
+                shared_ngrams.update(bucket)
+        # Most shared n-grams first, lowest index first on ties
+        ranked = sorted(shared_ngrams.items(), key=lambda item: (-item[1], item[0]))
+        candidate_set.update(idx for idx, _ in ranked[:self.max_ngram_candidates])
+
+        # Sorted so that ties are resolved exactly like the brute-force scan
+        return sorted(candidate_set)
+
+
 class AddressComparator:
 
-    def compare(self, processed_addresses, ground_truth, match_threshold=60, compare_threshold=70):
+    ASSIGNMENTS = ("greedy", "optimal")
+
+    def __init__(self, brute_force=False, bulk=False, assignment="greedy", processes=None):
+        """
+        brute_force: Score every ground truth record for every processed address instead of
+        using a ComparatorIndex. Slow on large ground truth, useful to verify the index.
+        bulk: Score all processed addresses against the whole ground truth at once with the
+        vectorized BulkScorer (needs rapidfuzz and numpy).
+        assignment: "greedy" matches each processed address to its best ground truth record in input
+        order, so a record taken earlier leaves later addresses unmatched. "optimal" solves the one-to-one
+        assignment over all candidate pairs with a linear sum assignment (needs scipy).
+        processes: Score on this many worker processes with a ParallelScorer, so comparisons of
+        several files are not serialized by the GIL. Call close() when done.
+        """
+        if assignment not in self.ASSIGNMENTS:
+            raise ValueError(f"Unknown assignment '{assignment}', expected one of {', '.join(self.ASSIGNMENTS)}.")
+        self.brute_force = brute_force
+        self.bulk = bulk
+        self.assignment = assignment
+        self.processes = processes
+        self._index = None
+        self._bulk_scorer = None
+        self._parallel_scorer = None
+        self._normalized = None  # (ground truth, normalized records, exact-match map)
+        self._index_lock = threading.Lock()
+
+    def build_index(self, ground_truth, **index_options):
+        """Build (or reuse) the ComparatorIndex for this ground truth list."""
+        with self._index_lock:
+            if self._index is None or self._index.ground_truth is not ground_truth:
+                self._index = ComparatorIndex(ground_truth, **index_options)
+            return self._index
+
+    def build_normalized(self, ground_truth):
+        """
+        Build (or reuse) the normalized ground truth for this list: a function from truth index to its
+        normalized record, and the exact-match map from normalized tuple to the lowest truth index.
+        """
+        with self._index_lock:
+            if self._normalized is None or self._normalized[0] is not ground_truth:
+                store_normalized = getattr(ground_truth, "normalized", None)
+                if store_normalized is not None:
+                    normalized_truth = store_normalized
+                    records = (store_normalized(idx) for idx in range(len(ground_truth)))
+                else:
+                    normalized_records = [normalize_record(truth_addr) for truth_addr in ground_truth]
+                    normalized_truth = normalized_records.__getitem__
+                    records = normalized_records
+                exact_index = {}
+                for idx, normalized in enumerate(records):
+                    # Identical records score the same, and ties go to the lowest index
+                    exact_index.setdefault(exact_key(normalized), idx)
+                self._normalized = (ground_truth, normalized_truth, exact_index)
+            return self._normalized[1], self._normalized[2]
+
+    def build_bulk_scorer(self, ground_truth, **scorer_options):
+        """Build (or reuse) the BulkScorer for this ground truth list."""
+        # Imported here so rapidfuzz and numpy are only needed when bulk scoring is used
+        from bulk_comparator import BulkScorer
+
+        with self._index_lock:
+            if self._bulk_scorer is None or self._bulk_scorer.ground_truth is not ground_truth:
+                self._bulk_scorer = BulkScorer(ground_truth, **scorer_options)
+            return self._bulk_scorer
+
+    def build_parallel_scorer(self, ground_truth, **scorer_options):
+        """Build (or reuse) the ParallelScorer for this ground truth list, replacing one built for another list."""
+        from parallel_comparator import ParallelScorer
+
+        with self._index_lock:
+            if self._parallel_scorer is None or self._parallel_scorer.ground_truth is not ground_truth:
+                if self._parallel_scorer is not None:
+                    self._parallel_scorer.close()
+                self._parallel_scorer = ParallelScorer(ground_truth, processes=self.processes,
+                                                       brute_force=self.brute_force, **scorer_options)
+            return self._parallel_scorer
+
+    def close(self):
+        """Stop the worker processes of the parallel scorer, if one was built."""
+        with self._index_lock:
+            if self._parallel_scorer is not None:
+                self._parallel_scorer.close()
+                self._parallel_scorer = None
+
+    def candidate_pairs(self, processed_addresses, ground_truth, match_threshold, index=None):
+        """
+        All (processed position, truth index) pairs eligible for a match with their weighted score:
+        the postcode score must exceed match_threshold and the weighted score must reach it.
+        Candidates come from the bulk scorer, the worker processes, the index, or a full scan, depending on the engine.
+        """
+        pairs = {}
+        if self.bulk:
+            import numpy as np
+
+            scorer = self.build_bulk_scorer(ground_truth)
+            for start in range(0, len(processed_addresses), scorer.chunk_size):
+                total_scores, postcode_scores = scorer.score_matrix(processed_addresses[start:start + scorer.chunk_size])
+                rows, cols = np.nonzero((postcode_scores > match_threshold) & (total_scores >= match_threshold))
+                for row, col in zip(rows.tolist(), cols.tolist()):
+                    pairs[(start + row, col)] = float(total_scores[row, col])
+            return pairs
+        if self.processes:
+            return self.build_parallel_scorer(ground_truth).candidate_pairs(processed_addresses, match_threshold)
+
+        if not self.brute_force and index is None:
+            index = self.build_index(ground_truth)
+        normalized_truth, _ = self.build_normalized(ground_truth)
+        for position, processed_addr in enumerate(processed_addresses):
+            processed_normalized = normalize_record(processed_addr)
+            candidate_indices = range(len(ground_truth)) if self.brute_force else index.candidates(processed_addr)
+            for idx in candidate_indices:
+                truth_normalized = normalized_truth(idx)
+                # A pair is only eligible with a close postcode, so the other fields need not be scored otherwise
+                postcode_score = fuzz.ratio(processed_normalized['Postcode'], truth_normalized['Postcode'])
+                if postcode_score <= match_threshold:
+                    continue
+                total_score = weighted_total(field_scores(processed_normalized, truth_normalized, postcode_score))
+                if total_score >= match_threshold:
+                    pairs[(position, idx)] = total_score
+        return pairs
+
+    def optimal_assignment(self, processed_addresses, ground_truth, match_threshold, index=None):
+        """
+        One-to-one assignment that first maximizes the number of matches, then the total weighted score.
+
+        Only eligible candidate pairs are kept (see candidate_pairs). The bipartite graph they form is
+        split into connected components and each component is solved separately with scipy's
+        linear_sum_assignment, so thousands of records stay cheap as long as candidates are sparse.
+        Returns one (truth record, score, truth index) per processed address, or None if unassigned.
+        """
+        import numpy as np
+        from scipy.optimize import linear_sum_assignment
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        assignment = [None] * len(processed_addresses)
+        pairs = self.candidate_pairs(processed_addresses, ground_truth, match_threshold, index)
+        if not pairs:
+            return assignment
+
+        # Graph nodes: processed addresses first, then the truth records that appear in any pair
+        truth_indices = sorted({idx for _, idx in pairs})
+        truth_nodes = {idx: len(processed_addresses) + node for node, idx in enumerate(truth_indices)}
+        node_count = len(processed_addresses) + len(truth_indices)
+        rows = [position for position, _ in pairs]
+        cols = [truth_nodes[idx] for _, idx in pairs]
+        graph = coo_matrix((np.ones(len(pairs)), (rows, cols)), shape=(node_count, node_count))
+        _, labels = connected_components(graph, directed=False)
+
+        components = defaultdict(lambda: ([], []))
+        for position in sorted({position for position, _ in pairs}):
+            components[labels[position]][0].append(position)
+        for idx in truth_indices:
+            components[labels[truth_nodes[idx]]][1].append(idx)
+
+        # Each match is worth more than any score difference, so more matches always win
+        match_bonus = 1000.0
+        for positions, indices in components.values():
+            weights = np.zeros((len(positions), len(indices)))
+            for row, position in enumerate(positions):
+                for col, idx in enumerate(indices):
+                    score = pairs.get((position, idx))
+                    if score is not None:
+                        weights[row, col] = match_bonus + score
+            for row, col in zip(*linear_sum_assignment(weights, maximize=True)):
+                if weights[row, col] > 0:
+                    position, idx = positions[row], indices[col]
+                    assignment[position] = (ground_truth[idx], pairs[(position, idx)], idx)
+        return assignment
+
+    def compare(self, processed_addresses, ground_truth, match_threshold=60, compare_threshold=70, index=None, stats=None):
         """
         Step 1: Fuzzy match the processed addresses to the ground truth using weighted matching.
         Step 2: Precisely compare the fields of the matched addresses.
 
         match_threshold: The threshold for fuzzy matching (default is 60%).
         compare_threshold: The threshold for precise field comparison (default is 70% for partial matching).
+        index: A prebuilt ComparatorIndex for this ground truth. Built and cached on first use if omitted.
+        stats: Optional dict filled with details about the run: "processed", "exact_matches" (processed
+        addresses resolved by the exact-match pass), "field_comparisons" and "field_scores_reused" (matched
+        pairs whose field scores were kept from matching); with optimal assignment, "assignment_changes"
+        lists the processed addresses matched differently than greedy mode would.
+
+        Processed addresses whose normalized fields equal those of a ground truth record are matched to it
+        straight away (the lowest such index, as fuzzy matching would); only the rest are fuzzy matched.
         """
         comparison_report = []
         successful_matches = 0
         unmatched_entries = 0
 
-        # Helper function for fuzzy matching
-        def is_fuzzy_match(str1, str2, threshold):
-            """
-            Uses fuzzy string matching to determine if two strings are close enough.
-            Returns True if the similarity score is above the given threshold.
-            """
-            return fuzz.ratio(str1.lower(), str2.lower()) >= threshold
-
-        # Helper function to normalize postcodes (remove spaces)
-        def normalize_postcode(postcode):
-            return postcode.replace(" ", "").lower() if postcode else ""
+        if not self.brute_force and not self.bulk and not self.processes and index is None:
+            index = self.build_index(ground_truth)
+        normalized_truth, exact_index = self.build_normalized(ground_truth)
+        # Each processed address is normalized once, for matching and for the field comparison
+        processed_normalized = [normalize_record(processed_addr) for processed_addr in processed_addresses]
+        # Field scores of the best candidate of each processed address, keyed by (position, truth index)
+        pair_scores = {}
 
         # Helper function to find the best match from the ground truth with weighted scoring
-        def find_best_match(processed_addr, ground_truth):
+        def find_best_match(position, ground_truth):
             """
-            Compare processed_addr with each entry in the ground truth and return the best match using weighted scoring.
+            Compare a processed address with each candidate in the ground truth and return the best match using weighted scoring.
             Postcodes are weighted heavily, while names and streets have lower weights.
             """
-            best_match = None
             best_score = 0
             best_truth_index = None
+            best_field_scores = None
 
-            for idx, truth_addr in enumerate(ground_truth):
-                first_name_score = fuzz.ratio(processed_addr['FirstName'].lower(), truth_addr['FirstName'].lower())
-                last_name_score = fuzz.ratio(processed_addr['LastName'].lower(), truth_addr['LastName'].lower())
-                street_score = fuzz.ratio(processed_addr['StreetName'].lower(), truth_addr['StreetName'].lower())
-                town_score = fuzz.ratio(processed_addr['Town'].lower(), truth_addr['Town'].lower())
-                postcode_score = fuzz.ratio(normalize_postcode(processed_addr['Postcode']), normalize_postcode(truth_addr['Postcode']))
+            if self.brute_force:
+                candidate_indices = range(len(ground_truth))
+            else:
+                candidate_indices = index.candidates(processed_addresses[position])
 
-                # Apply weighted scoring to favor postcode matches
-                total_score = (postcode_score * 3 + last_name_score * 2 + first_name_score + street_score + town_score) / 8
+            processed = processed_normalized[position]
+            for idx in candidate_indices:
+                truth = normalized_truth(idx)
+                # Only consider matches where postcodes are reasonably similar; skip scoring the rest otherwise
+                postcode_score = fuzz.ratio(processed['Postcode'], truth['Postcode'])
+                if postcode_score <= match_threshold:
+                    continue
 
-                # Only consider matches where postcodes are reasonably similar
-                if postcode_score > match_threshold and total_score > best_score:
+                # Apply weighted scoring to favor postcode matches
+                scores = field_scores(processed, truth, postcode_score)
+                total_score = weighted_total(scores)
+                if total_score > best_score:
                     best_score = total_score
-                    best_match = truth_addr
                     best_truth_index = idx
+                    best_field_scores = scores
 
-            return best_match, best_score, best_truth_index
+            if best_truth_index is None:
+                return None, best_score, None
+            pair_scores[(position, best_truth_index)] = best_field_scores
+            return ground_truth[best_truth_index], best_score, best_truth_index
 
         # Step 1: Fuzzy match records and find the best match for each processed address
         matches = []  # Store pairs of matched records
         matched_ground_truth_indices = set()  # Keep track of which ground truth records have been matched
 
-        for processed_addr in processed_addresses:
-            best_match, best_score, best_truth_index = find_best_match(processed_addr, ground_truth)
+        # Exact matches score 100 on every field, which nothing beats; they need no fuzzy scoring
+        best_matches = [None] * len(processed_addresses)
+        if match_threshold < 100:
+            for position, processed in enumerate(processed_normalized):
+                idx = exact_index.get(exact_key(processed))
+                if idx is not None:
+                    best_matches[position] = (ground_truth[idx], 100.0, idx)
+                    pair_scores[(position, idx)] = dict.fromkeys(processed, 100)
+        remaining = [position for position, best in enumerate(best_matches) if best is None]
+        remaining_addresses = [processed_addresses[position] for position in remaining]
 
+        if self.bulk:
+            # Score every remaining processed address in one go, then assign greedily exactly as below
+            scored = [
+                (ground_truth[idx] if idx is not None else None, score, idx)
+                for idx, score in self.build_bulk_scorer(ground_truth).best_matches(remaining_addresses, match_threshold)
+            ] if remaining_addresses else []
+        elif self.processes:
+            # Same scoring as find_best_match, spread over the worker processes in chunks
+            scored = [
+                (ground_truth[idx] if idx is not None else None, score, idx)
+                for idx, score in self.build_parallel_scorer(ground_truth).best_matches(remaining_addresses, match_threshold)
+            ] if remaining_addresses else []
+        else:
+            scored = [find_best_match(position, ground_truth) for position in remaining]
+        for position, best in zip(remaining, scored):
+            best_matches[position] = best
+
+        # Greedy assignment: first come, first served on the best match of each processed address
+        greedy_assignment = []
+        greedy_taken = set()
+        for best_match, best_score, best_truth_index in best_matches:
             # Only match if we have a strong enough match based on the weighted score
-            if best_match and best_truth_index not in matched_ground_truth_indices and best_score >= match_threshold:
-                matches.append((processed_addr, best_match, best_truth_index, best_score))
+            if best_match and best_truth_index not in greedy_taken and best_score >= match_threshold:
+                greedy_assignment.append((best_match, best_score, best_truth_index))
+                greedy_taken.add(best_truth_index)
+            else:
+                greedy_assignment.append(None)
+
+        if self.assignment == "optimal":
+            assignment = self.optimal_assignment(processed_addresses, ground_truth, match_threshold, index)
+            if stats is not None:
+                stats["assignment_changes"] = [
+                    {
+                        "processed_address": processed_addr,
+                        "greedy_truth_index": greedy[2] if greedy else None,
+                        "optimal_truth_index": optimal[2] if optimal else None
+                    }
+                    for processed_addr, greedy, optimal in zip(processed_addresses, greedy_assignment, assignment)
+                    if (greedy[2] if greedy else None) != (optimal[2] if optimal else None)
+                ]
+        else:
+            assignment = greedy_assignment
+
+        for position, (processed_addr, assigned) in enumerate(zip(processed_addresses, assignment)):
+            if assigned:
+                best_match, best_score, best_truth_index = assigned
+                matches.append((position, processed_addr, best_match, best_truth_index, best_score))
                 matched_ground_truth_indices.add(best_truth_index)
             else:
                 # If no match is found, mark the processed address as unmatched
@@ -76,39 +475,46 @@ class AddressComparator:
                 unmatched_entries += 1
 
         # Step 2: Precisely compare the matched records
-        for processed, truth, truth_index, match_score in matches:
+        field_scores_reused = 0
+        for position, processed, truth, truth_index, match_score in matches:
             differences = []
+            # Field scores from step 1 when this pair was scored there, otherwise scored now
+            scores = pair_scores.get((position, truth_index))
+            if scores is not None:
+                field_scores_reused += 1
+            else:
+                scores = field_scores(processed_normalized[position], normalized_truth(truth_index))
 
             # Compare important fields with precise matching
-            if not is_fuzzy_match(processed['FirstName'], truth['FirstName'], compare_threshold):
+            if scores['FirstName'] < compare_threshold:
                 differences.append({
                     "field": "FirstName",
                     "processed_value": processed['FirstName'],
                     "expected_value": truth['FirstName']
                 })
 
-            if not is_fuzzy_match(processed['LastName'], truth['LastName'], compare_threshold):
+            if scores['LastName'] < compare_threshold:
                 differences.append({
                     "field": "LastName",
                     "processed_value": processed['LastName'],
                     "expected_value": truth['LastName']
                 })
 
-            if not is_fuzzy_match(processed['StreetName'], truth['StreetName'], compare_threshold):
+            if scores['StreetName'] < compare_threshold:
                 differences.append({
                     "field": "StreetName",
                     "processed_value": processed['StreetName'],
                     "expected_value": truth['StreetName']
                 })
 
-            if not is_fuzzy_match(processed['Town'], truth['Town'], compare_threshold):
+            if scores['Town'] < compare_threshold:
                 differences.append({
                     "field": "Town",
                     "processed_value": processed['Town'],
                     "expected_value": truth['Town']
                 })
 
-            if normalize_postcode(processed['Postcode']) != normalize_postcode(truth['Postcode']):
+            if processed_normalized[position]['Postcode'] != normalized_truth(truth_index)['Postcode']:
                 differences.append({
                     "field": "Postcode",
                     "processed_value": processed['Postcode'],
@@ -143,6 +549,12 @@ class AddressComparator:
                 })
                 unmatched_entries += 1
 
+        if stats is not None:
+            stats["processed"] = len(processed_addresses)
+            stats["exact_matches"] = len(processed_addresses) - len(remaining)
+            stats["field_comparisons"] = len(matches)
+            stats["field_scores_reused"] = field_scores_reused
+
         # Log match and mismatch counts
         print(f"Matched addresses: {successful_matches}")
         print(f"Unmatched or differing addresses: {unmatched_entries + len(comparison_report)}")
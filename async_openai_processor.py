@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import asyncio
+from openai import AsyncOpenAI
+from openai_processor import OpenAIProcessor
+from rate_limiter import RequestScheduler
+from llm_backends import AsyncOpenAIBackend
+
+class AsyncOpenAIProcessor(OpenAIProcessor):
+    """
+    asyncio version of OpenAIProcessor built on AsyncOpenAI.
+
+    Every request goes through a RequestScheduler, which should be shared by all files in a run
+    so the whole run has one concurrency ceiling and one set of rate limits. Prompts, the response
+    cache and batching helpers are inherited; the methods that talk to the API are coroutines here.
+    """
+
+    def __init__(self, scheduler=None, client=None, cache=None, base_url=None, local_parser=None, telemetry=None,
+                 backend=None, deduplicator=None):
+        """
+        scheduler: The RequestScheduler shared across files. A default one is created if omitted.
+        client: An AsyncOpenAI-compatible client. Defaults to a real AsyncOpenAI client.
+        cache: An optional ResponseCache used for every model call.
+        base_url: API base URL, e.g. a local fake server for load tests.
+        local_parser: An optional LocalAddressParser; addresses it parses confidently skip the model.
+        telemetry: An optional Telemetry that records latency, token usage and cost of every call.
+        backend: An LLMBackend with acomplete(), e.g. a ReplayBackend. Defaults to an AsyncOpenAIBackend around client.
+        deduplicator: An optional RequestDeduplicator; copies of an address written differently are formatted once.
+        """
+        if backend is None:
+            # Retries are handled by the scheduler, so the client must not retry on its own
+            client = client or AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url, max_retries=0)
+            backend = AsyncOpenAIBackend(client)
+        super().__init__(cache=cache, local_parser=local_parser, telemetry=telemetry, backend=backend, deduplicator=deduplicator,
+                         base_url=base_url)
+        self.scheduler = scheduler or RequestScheduler()
+
+    async def create_completion(self, prompt_type, version, prompt, user_content, validate=None, **params):
+        """Async create_completion: send one scheduled chat completion and return the message content."""
+        content, _ = await self.create_completion_with_usage(prompt_type, version, prompt, user_content, validate, **params)
+        return content
+
+    async def create_completion_with_usage(self, prompt_type, version, prompt, user_content, validate=None, **params):
+        """Async create_completion_with_usage: returns (content, usage), usage is None on a cache hit."""
+        start = time.perf_counter()
+        params = self.sampling_params(params)
+        cache_key = self.cache_key(prompt_type, version, prompt, user_content, params)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None and self.is_cacheable(cached, validate):
+                self.record_call(prompt_type, start, cached=True)
+                return cached, None
+
+        # Charge the token bucket up front with an estimate, then correct it with the real usage
+        estimated_tokens = self.estimate_tokens(prompt) + self.estimate_tokens(user_content) + params.get("max_tokens", 0) // 4
+
+        # Latency of the last attempt; waiting on the scheduler and retry backoff count as queue wait
+        attempt = {"latency": None}
+
+        async def make_request():
+            sent = time.perf_counter()
+            try:
+                return await self.backend.acomplete(self.model, self.build_messages(prompt, user_content), **params)
+            finally:
+                attempt["latency"] = time.perf_counter() - sent
+
+        try:
+            content, usage = await self.scheduler.run(make_request, estimated_tokens=estimated_tokens)
+        except Exception as e:
+            self.record_call(prompt_type, start, error=type(e).__name__, latency=attempt["latency"])
+            raise
+        self.record_call(prompt_type, start, usage=usage, latency=attempt["latency"])
+        if usage:
+            self.scheduler.record_usage(estimated_tokens, usage["prompt_tokens"] + usage["completion_tokens"])
+
+        if cache_key is not None and self.is_cacheable(content, validate):
+            self.cache.put(cache_key, content)
+        return content, usage
+
+    async def process_single_address(self, address, prompt_type, version):
+        """Process a single address with OpenAI."""
+        prompt = self.get_prompt(prompt_type, version)
+        if not prompt:
+            return {}
+
+        try:
+            response_content = await self.create_completion(prompt_type, version, prompt, address, self.is_address_response,
+                                                            **self.address_params())
+            return json.loads(response_content)
+        except Exception as e:
+            print(f"Error processing address with OpenAI: {str(e)}")
+            return {}
+
+    async def process_addresses_parallel(self, addresses, prompt_type, version):
+        """Process multiple addresses concurrently; the scheduler bounds how many are in flight."""
+        results = await asyncio.gather(
+            *(self.process_single_address(address, prompt_type, version) for address in addresses),
+            return_exceptions=True
+        )
+        formatted = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error in parallel processing: {str(result)}")
+            elif result:
+                formatted.append(result)
+        return formatted
+
+    async def process_address_batch(self, addresses, prompt_type, version, max_tokens=4095):
+        """Format several addresses with a single request, None for entries that came back missing or invalid."""
+        prompt = self.get_prompt(prompt_type, version)
+        if not prompt:
+            return [None] * len(addresses)
+
+        batch_prompt, numbered_addresses, params, stats = self.batch_request(addresses, prompt, max_tokens)
+        try:
+            response_content, usage = await self.create_completion_with_usage(
+                prompt_type, version, batch_prompt, numbered_addresses,
+                lambda content: self.is_batch_response(content, len(addresses)), **params)
+            if usage:
+                stats.update(usage)
+            items = json.loads(response_content).get("addresses", [])
+        except Exception as e:
+            print(f"Error processing address batch with OpenAI: {str(e)}")
+            items = []
+        return self.batch_results(addresses, items, stats)
+
+    async def process_addresses_batched(self, addresses, prompt_type, version, max_batch_size=20, token_budget=3000):
+        """Batched formatting with per-address fallback, results in input order."""
+        results = await self.batched_results(addresses, prompt_type, version, max_batch_size, token_budget)
+        return [result for result in results if result]
+
+    async def batched_results(self, addresses, prompt_type, version, max_batch_size=20, token_budget=3000):
+        """Async batched_results: one entry per address, empty or None where it failed."""
+        results = [None] * len(addresses)
+        batches = self.plan_batches(addresses, max_batch_size, token_budget)
+
+        batch_results = await asyncio.gather(
+            *(self.process_address_batch([addresses[position] for position in batch], prompt_type, version) for batch in batches)
+        )
+        for batch, batch_result in zip(batches, batch_results):
+            for position, result in zip(batch, batch_result):
+                results[position] = result
+
+        # Fall back to one request per address for anything the batches did not return
+        missing = [position for position, result in enumerate(results) if result is None]
+        fallback_results = await asyncio.gather(
+            *(self.process_single_address(addresses[position], prompt_type, version) for position in missing)
+        )
+        for position, result in zip(missing, fallback_results):
+            results[position] = result
+
+        return results
+
+    async def separate_addresses(self, addresses, version="v1"):
+        """Process addresses for separation (Step 1, expect plain text)."""
+        prompt = self.get_prompt('separate_addresses', version)
+        if not prompt:
+            return []
+
+        address_content = "\n".join(addresses)
+
+        try:
+            response_content = await self.create_completion(
+                'separate_addresses', version, prompt, address_content, self.is_separation_response,
+                max_tokens=4000,
+                temperature=0.7
+            )
+            return self.clean_text_response(response_content)
+        except Exception as e:
+            print(f"Error processing addresses with OpenAI: {str(e)}")
+            return []
+
+    async def format_addresses(self, separated_addresses, version="v1", batch_size=None, token_budget=3000):
+        """Process separated addresses for formatting (Step 2, expect structured output)."""
+        local_results, remaining = self.parse_locally(separated_addresses)
+        if not remaining:
+            return local_results
+        if self.deduplicator is not None:
+            formatted = await self.deduplicator.aresolve(
+                remaining, lambda addresses: self.format_in_order(addresses, version, batch_size, token_budget),
+                scope=(self.model, version))
+            return local_results + [result for result in formatted if result]
+        if batch_size and batch_size > 1:
+            return local_results + await self.process_addresses_batched(remaining, 'format_addresses', version,
+                                                                        max_batch_size=batch_size, token_budget=token_budget)
+        return local_results + await self.process_addresses_parallel(remaining, 'format_addresses', version)
+
+    async def format_in_order(self, addresses, version="v1", batch_size=None, token_budget=3000):
+        """Async format_in_order: model results in input order, empty where one failed."""
+        if batch_size and batch_size > 1:
+            return await self.batched_results(addresses, 'format_addresses', version, max_batch_size=batch_size, token_budget=token_budget)
+        return list(await asyncio.gather(*(self.process_single_address(address, 'format_addresses', version) for address in addresses)))
@@ -0,0 +1,162 @@
+import io
+import os
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import datetime
+import resource
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from openai_processor import OpenAIProcessor
+from async_openai_processor import AsyncOpenAIProcessor
+from rate_limiter import RequestScheduler
+from data_handler import DataHandler
+from address_comparator import AddressComparator
+from llm_backends import ReplayBackend, LatencyModel
+from telemetry import Telemetry
+from main import process_single_file, process_files_async
+
+
+def synthesize_inputs(scale, source_dir, target_dir):
+    """Copy every input file scale times into target_dir, so the corpus is scale x its shipped size. Returns the file names."""
+    os.makedirs(target_dir, exist_ok=True)
+    filenames = []
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith('.csv'):
+            continue
+        base_filename = os.path.splitext(filename)[0]
+        for copy in range(scale):
+            copy_name = f"{base_filename}_x{copy}.csv"
+            shutil.copyfile(os.path.join(source_dir, filename), os.path.join(target_dir, copy_name))
+            filenames.append(copy_name)
+    return filenames
+
+
+def count_separated(output_dir):
+    """Addresses separated in a run, from its *_step1.txt files."""
+    total = 0
+    for filename in os.listdir(output_dir):
+        if filename.endswith('_step1.txt'):
+            with open(os.path.join(output_dir, filename), 'r', encoding='utf-8') as txtfile:
+                total += sum(1 for line in txtfile if line.strip())
+    return total
+
+
+def run_pipeline(config):
+    """
+    Run the whole pipeline once on a synthesized corpus with the replay backend.
+    Meant to run in a fresh process so the peak RSS belongs to this run only.
+    """
+    work_dir = tempfile.mkdtemp(prefix="address_benchmark_")
+    try:
+        input_dir = os.path.join(work_dir, "input")
+        output_dir = os.path.join(work_dir, "output")
+        filenames = synthesize_inputs(config["scale"], config["input_dir"], input_dir)
+
+        telemetry = Telemetry()
+        backend = ReplayBackend(
+            recordings_dir=config["recordings_dir"],
+            input_dir=config["input_dir"],
+            latency=LatencyModel(config["latency_kind"], config["latency"], config["latency_sigma"], rng=random.Random(config["seed"])),
+            error_rate=config["error_rate"],
+            seed=config["seed"]
+        )
+        data_handler = DataHandler()
+        ground_truth = data_handler.read_json('ground_truth.json')
+        comparator = AddressComparator()
+        comparator.build_index(ground_truth)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if config["use_async"]:
+                # Rate limits are not what is being measured here, only the concurrency ceiling
+                scheduler = RequestScheduler(max_concurrency=config["concurrency"], requests_per_minute=10 ** 9,
+                                             tokens_per_minute=10 ** 12, telemetry=telemetry)
+                processor = AsyncOpenAIProcessor(scheduler=scheduler, telemetry=telemetry, backend=backend)
+                results = asyncio.run(process_files_async(filenames, processor, data_handler, comparator, ground_truth,
+                                                          config["batch_size"], telemetry, input_dir, output_dir))
+            else:
+                processor = OpenAIProcessor(telemetry=telemetry, backend=backend)
+                with ThreadPoolExecutor(max_workers=config["concurrency"]) as executor:
+                    results = list(executor.map(
+                        lambda filename: process_single_file(filename, processor, data_handler, comparator, ground_truth,
+                                                             config["batch_size"], config["stream"], telemetry, input_dir, output_dir),
+                        filenames
+                    ))
+            elapsed = time.perf_counter() - start
+
+        summary = telemetry.summary()
+        addresses = count_separated(output_dir)
+        return dict(
+            config,
+            files=len(filenames),
+            addresses=addresses,
+            passes=sum(1 for result in results if result["status"] == "PASS"),
+            wall_time_s=elapsed,
+            addresses_per_s=addresses / elapsed if elapsed else 0.0,
+            stages={stage: stats["total_s"] for stage, stats in summary["stages"].items()},
+            requests=summary["totals"]["requests"],
+            retries=summary["totals"]["retries"],
+            replay_misses=backend.misses,
+            # ru_maxrss is in kilobytes on Linux
+            peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(scales, concurrencies, use_async, stream, batch_size, latency_kind, latency, latency_sigma, error_rate, seed, output_file):
+    configs = [
+        {
+            "scale": scale, "concurrency": concurrency, "use_async": use_async, "stream": stream, "batch_size": batch_size,
+            "latency_kind": latency_kind, "latency": latency, "latency_sigma": latency_sigma, "error_rate": error_rate,
+            "seed": seed, "input_dir": 'input_data', "recordings_dir": 'output_data'
+        }
+        for scale in scales for concurrency in concurrencies
+    ]
+
+    print(f"{'Scale':>6} {'Conc.':>6} {'Files':>7} {'Addresses':>10} {'Wall s':>8} {'Addr/s':>9} {'Peak MB':>8} "
+          f"{'Retries':>8} {'Pass':>6}  Stage totals (s)")
+    results = []
+    for config in configs:
+        # A fresh process per run keeps the peak memory of one run out of the next
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(run_pipeline, config).result()
+        results.append(result)
+        stages = ", ".join(f"{stage} {seconds:.2f}" for stage, seconds in sorted(result["stages"].items()))
+        print(f"{result['scale']:>5}x {result['concurrency']:>6} {result['files']:>7} {result['addresses']:>10} "
+              f"{result['wall_time_s']:>8.2f} {result['addresses_per_s']:>9.1f} {result['peak_rss_mb']:>8.1f} "
+              f"{result['retries']:>8} {result['passes']:>6}  {stages}")
+
+    output_file = output_file or datetime.datetime.now().strftime('output_data/benchmarks/benchmark_%Y-%m-%d_%H-%M-%S.json')
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as jsonfile:
+        json.dump(results, jsonfile, indent=4)
+    print(f"Benchmark results saved to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="End-to-end benchmark of the pipeline, offline, with model responses replayed from output_data/.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Corpus sizes to run, as multiples of the input_data/ corpus.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[5, 20],
+                        help="Concurrency settings: files in flight, or with --async the scheduler's request ceiling.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Benchmark the asyncio processor.")
+    parser.add_argument("--stream", action="store_true", help="Use streaming separation (not used with --async).")
+    parser.add_argument("--batch-size", type=int, default=None, help="Format this many addresses per request.")
+    parser.add_argument("--latency-distribution", choices=LatencyModel.KINDS, default="lognormal",
+                        help="Distribution of the simulated call latency.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean (median for lognormal) call latency in seconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Spread of the lognormal latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of calls failing with a simulated rate limit error.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Where to save the JSON results (default output_data/benchmarks/).")
+    args = parser.parse_args()
+    main(args.scales, args.concurrency, args.use_async, args.stream, args.batch_size, args.latency_distribution,
+         args.latency, args.latency_sigma, args.error_rate, args.seed, args.output)
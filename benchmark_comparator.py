@@ -0,0 +1,116 @@
+import io
+import time
+import random
+import argparse
+import contextlib
+from data_handler import DataHandler
+from address_comparator import AddressComparator, normalize_postcode, weighted_score
+
+FIELDS = ["FirstName", "LastName", "StreetName", "Town", "Postcode", "Country"]
+
+
+def synthesize_ground_truth(base, size, rng):
+    """Grow the shipped ground truth to size records by recombining its fields and varying numbers and postcodes."""
+    records = []
+    for i in range(size):
+        template = base[i % len(base)]
+        donor = base[rng.randrange(len(base))]
+        outward = normalize_postcode(template["Postcode"])[:-3].upper()
+        records.append({
+            "FirstName": donor["FirstName"],
+            "LastName": template["LastName"] if i < len(base) else f"{template['LastName']}{i // len(base)}",
+            "StreetName": f"{rng.randint(1, 999)} {template['StreetName'].split(' ', 1)[-1]}",
+            "Town": template["Town"],
+            "Postcode": template["Postcode"] if i < len(base) else f"{outward} {rng.randint(0, 9)}{rng.choice('ABDEFGHJLNPQRSTUWXYZ')}{rng.choice('ABDEFGHJLNPQRSTUWXYZ')}",
+            "Country": "GB"
+        })
+    return records
+
+
+def perturb(record, rng, fields=FIELDS[:5]):
+    """
+    A processed address as the model might return it: the truth record with a typo in one of
+    the fields given (the scored ones by default, postcode included), and now and then a field
+    left empty.
+    """
+    processed = dict(record)
+    field = rng.choice(fields)
+    value = list(processed[field])
+    if value:
+        value[rng.randrange(len(value))] = rng.choice("abcdefghijklmnopqrstuvwxyz0123456789" if field == "Postcode"
+                                                      else "abcdefghijklmnopqrstuvwxyz")
+    processed[field] = "".join(value)
+    if rng.random() < 0.2:
+        processed[rng.choice(FIELDS[:5])] = ""
+    return processed
+
+
+def time_compare(comparator, processed, ground_truth):
+    """Run one comparison (index / scorer already built) and return (seconds, report)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        report = comparator.compare(processed, ground_truth)
+    return time.perf_counter() - start, report
+
+
+def check_score_parity(ground_truth, processed):
+    """Compare every bulk score against the pairwise weighted_score. Returns (pairs checked, max difference, mismatches)."""
+    from bulk_comparator import BulkScorer
+
+    total_scores, postcode_scores = BulkScorer(ground_truth).score_matrix(processed)
+    max_difference = 0.0
+    mismatches = 0
+    for i, processed_addr in enumerate(processed):
+        for j, truth_addr in enumerate(ground_truth):
+            total_score, postcode_score = weighted_score(processed_addr, truth_addr)
+            difference = max(abs(total_score - float(total_scores[i, j])), abs(postcode_score - float(postcode_scores[i, j])))
+            max_difference = max(max_difference, difference)
+            mismatches += difference > 1e-6
+    return len(processed) * len(ground_truth), max_difference, mismatches
+
+
+def main(sizes, processed_count, max_brute_force, seed):
+    rng = random.Random(seed)
+    base = DataHandler().read_json('ground_truth.json')
+    if not base:
+        print("Error: Ground truth file ground_truth.json is missing or invalid.")
+        return
+
+    parity_processed = [perturb(record, rng) for record in base]
+    pairs, max_difference, mismatches = check_score_parity(base, parity_processed)
+    print(f"Score parity on {pairs} pairs: max difference {max_difference:.3f}, {mismatches} mismatching pairs "
+          f"(exact only with python-Levenshtein installed; fuzzywuzzy's difflib fallback rounds differently)")
+    print()
+
+    print(f"{'Truth size':>10} {'Engine':<12} {'Build s':>8} {'Compare s':>10} {'Addr/s':>10} {'Same as brute force':>20}")
+    for size in sizes:
+        ground_truth = synthesize_ground_truth(base, size, rng)
+        processed = [perturb(ground_truth[rng.randrange(size)], rng) for _ in range(processed_count)]
+
+        engines = [("index", AddressComparator(), "build_index"), ("bulk", AddressComparator(bulk=True), "build_bulk_scorer")]
+        if size <= max_brute_force:
+            engines.insert(0, ("brute force", AddressComparator(brute_force=True), None))
+
+        reference_report = None
+        for name, comparator, build_method in engines:
+            build_seconds = 0.0
+            if build_method:
+                start = time.perf_counter()
+                getattr(comparator, build_method)(ground_truth)
+                build_seconds = time.perf_counter() - start
+            seconds, report = time_compare(comparator, processed, ground_truth)
+            if reference_report is None and name == "brute force":
+                reference_report = report
+            same = "n/a" if reference_report is None else str(report == reference_report)
+            print(f"{size:>10} {name:<12} {build_seconds:>8.2f} {seconds:>10.2f} {processed_count / seconds:>10.1f} {same:>20}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the comparator engines on synthetic ground truth.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Ground truth sizes to test.")
+    parser.add_argument("--processed", type=int, default=200, help="Processed addresses compared at each size.")
+    parser.add_argument("--max-brute-force", type=int, default=10000,
+                        help="Largest ground truth the brute-force engine is run on (it is quadratic).")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    main(args.sizes, args.processed, args.max_brute_force, args.seed)
@@ -0,0 +1,79 @@
+try:
+    import numpy as np
+    from rapidfuzz import fuzz as rapid_fuzz, process
+except ImportError:  # Optional: pip install rapidfuzz numpy
+    np = None
+    rapid_fuzz = None
+    process = None
+
+from address_comparator import normalize_postcode
+
+# Field weights of the weighted match score, same as AddressComparator.find_best_match
+FIELD_WEIGHTS = {"Postcode": 3, "LastName": 2, "FirstName": 1, "StreetName": 1, "Town": 1}
+
+
+class BulkScorer:
+    """
+    Vectorized version of the weighted scoring in AddressComparator.
+
+    Each field's processed x truth fuzz.ratio matrix is computed in a single rapidfuzz
+    process.cdist call (C++, multi-threaded) and the weighting and postcode threshold are applied
+    with NumPy. Scores are rounded like fuzzywuzzy's ratio, so they match fuzzywuzzy exactly
+    when python-Levenshtein is installed; the pure-python difflib fallback of fuzzywuzzy can
+    differ by a point on some pairs.
+
+    Processed addresses are scored in chunks of chunk_size rows to bound memory on large ground truth.
+    workers: Threads used by cdist (-1 for all cores).
+    """
+
+    def __init__(self, ground_truth, chunk_size=256, workers=-1):
+        if np is None:
+            raise ImportError("BulkScorer needs the optional rapidfuzz and numpy packages (pip install rapidfuzz numpy).")
+        self.ground_truth = ground_truth
+        self.chunk_size = chunk_size
+        self.workers = workers
+        # Normalize the ground truth once instead of on every comparison (a GroundTruthStore is normalized already)
+        if hasattr(ground_truth, "normalized_column"):
+            self.truth_fields = {field: ground_truth.normalized_column(field) for field in FIELD_WEIGHTS}
+        else:
+            self.truth_fields = {field: self.normalize_field(field, [truth_addr[field] for truth_addr in ground_truth])
+                                 for field in FIELD_WEIGHTS}
+
+    def normalize_field(self, field, values):
+        """Lowercase a column of values; postcodes also lose their spaces."""
+        if field == "Postcode":
+            return [normalize_postcode(value) for value in values]
+        return [value.lower() for value in values]
+
+    def field_scores(self, field, processed_addresses):
+        """fuzz.ratio matrix (processed x truth) for one field, rounded to whole points like fuzzywuzzy."""
+        processed_values = self.normalize_field(field, [processed_addr[field] for processed_addr in processed_addresses])
+        scores = process.cdist(processed_values, self.truth_fields[field], scorer=rapid_fuzz.ratio,
+                               dtype=np.float32, workers=self.workers)
+        return np.rint(scores)
+
+    def score_matrix(self, processed_addresses):
+        """
+        Return (total_scores, postcode_scores) for processed_addresses against the whole ground truth.
+        total_scores is the weighted score (postcode x3, last name x2, other fields x1) divided by 8.
+        """
+        field_scores = {field: self.field_scores(field, processed_addresses) for field in FIELD_WEIGHTS}
+        total_scores = sum(field_scores[field] * weight for field, weight in FIELD_WEIGHTS.items()) / sum(FIELD_WEIGHTS.values())
+        return total_scores, field_scores["Postcode"]
+
+    def best_matches(self, processed_addresses, match_threshold=60):
+        """
+        Best ground truth index and score for each processed address, with the same rules as
+        find_best_match: the postcode score must exceed match_threshold, the score must be above 0
+        and ties go to the lowest index. Returns a list of (index, score), (None, 0) where nothing qualifies.
+        """
+        matches = []
+        for start in range(0, len(processed_addresses), self.chunk_size):
+            chunk = processed_addresses[start:start + self.chunk_size]
+            total_scores, postcode_scores = self.score_matrix(chunk)
+            masked_scores = np.where(postcode_scores > match_threshold, total_scores, 0)
+            best_indices = np.argmax(masked_scores, axis=1)
+            best_scores = masked_scores[np.arange(len(chunk)), best_indices]
+            for best_index, best_score in zip(best_indices.tolist(), best_scores.tolist()):
+                matches.append((best_index, best_score) if best_score > 0 else (None, 0))
+        return matches
@@ -6,38 +6,43 @@ class DataHandler:
 
     def read_csv(self, file_path):
         """Reads the input CSV file and returns the addresses as a list of strings."""
-        addresses = []
+        addresses = list(self.iter_csv(file_path))
+        if not addresses and os.path.exists(file_path):
+            print(f"Warning: No valid addresses found in the CSV file {file_path}.")
+        return addresses
+
+    def iter_csv(self, file_path):
+        """Lazily yields the non-empty rows of the input CSV file, each joined into one string."""
         try:
             with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
                 reader = csv.reader(csvfile)
                 for row in reader:
                     # Ensure row is not empty
                     if row and any(field.strip() for field in row):
-                        addresses.append(' '.join(row))
-            if not addresses:
-                print(f"Warning: No valid addresses found in the CSV file {file_path}.")
+                        yield ' '.join(row)
         except FileNotFoundError:
             print(f"Error: File {file_path} not found.")
         except Exception as e:
             print(f"Error reading CSV file: {str(e)}")
-        return addresses
 
     def save_txt(self, file_path, data):
-        """Saves data to a plain text file."""
+        """Saves data to a plain text file (through a temporary file, so a crash never leaves it half written)."""
         try:
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as txtfile:
+            with open(f"{file_path}.tmp", 'w', encoding='utf-8') as txtfile:
                 txtfile.write("\n".join(data))  # Save each address as one string per line
+            os.replace(f"{file_path}.tmp", file_path)
         except Exception as e:
             print(f"Error saving TXT file {file_path}: {str(e)}")
 
 
     def save_json(self, file_path, data):
-        """Saves data to a JSON file."""
+        """Saves data to a JSON file (through a temporary file, so a crash never leaves it half written)."""
         try:
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as jsonfile:
+            with open(f"{file_path}.tmp", 'w', encoding='utf-8') as jsonfile:
                 json.dump(data, jsonfile, indent=4)
+            os.replace(f"{file_path}.tmp", file_path)
         except Exception as e:
             print(f"Error saving JSON file {file_path}: {str(e)}")
 
@@ -55,3 +60,21 @@ class DataHandler:
         except Exception as e:
             print(f"Error reading JSON file {file_path}: {str(e)}")
             return None
+
+    def read_ground_truth(self, file_path):
+        """
+        Reads the ground truth: a compiled GroundTruthStore (.gtstore, memory-mapped) or a JSON list of records.
+        """
+        if not file_path.endswith('.gtstore'):
+            return self.read_json(file_path)
+        # Imported here so the JSON path does not depend on the comparator modules
+        from ground_truth_store import GroundTruthStore
+
+        try:
+            return GroundTruthStore(file_path)
+        except FileNotFoundError:
+            print(f"Error: File {file_path} not found.")
+            return None
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return None
@@ -0,0 +1,74 @@
+import os
+import io
+import time
+import argparse
+import contextlib
+from data_handler import DataHandler
+from address_comparator import AddressComparator
+from local_parser import LocalAddressParser
+
+def evaluate_file(label, addresses, parser, comparator, ground_truth):
+    """Parse one file's addresses locally and score the bypassed records against the ground truth."""
+    start = time.perf_counter()
+    records, remaining = parser.split(addresses)
+    elapsed = time.perf_counter() - start
+
+    # compare() prints its own summary; keep the evaluation table readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        comparison_report = comparator.compare(records, ground_truth)
+    wrong = sum(1 for entry in comparison_report if entry["processed_address"] is not None)
+
+    return {
+        "file": label,
+        "addresses": len(addresses),
+        "bypassed": len(records),
+        "bypass_rate": len(records) / len(addresses) if addresses else 0.0,
+        "correct": len(records) - wrong,
+        "accuracy": (len(records) - wrong) / len(records) if records else 0.0,
+        "parse_us_per_address": elapsed * 1e6 / len(addresses) if addresses else 0.0
+    }
+
+def main(min_confidence=0.8, use_raw_rows=False):
+    data_handler = DataHandler()
+    comparator = AddressComparator()
+    parser = LocalAddressParser(min_confidence=min_confidence)
+    ground_truth = data_handler.read_json('ground_truth.json')
+    if not ground_truth:
+        print("Error: Ground truth file ground_truth.json is missing or invalid.")
+        return
+
+    # Score what the fast path would see: the separated addresses from Step 1 where a previous run
+    # left them, otherwise the raw CSV rows
+    sources = []
+    for filename in sorted(os.listdir('input_data/')):
+        if not filename.endswith('.csv'):
+            continue
+        step1_file = f"output_data/{os.path.splitext(filename)[0]}_step1.txt"
+        if not use_raw_rows and os.path.exists(step1_file):
+            with open(step1_file, 'r', encoding='utf-8') as txtfile:
+                sources.append((filename, [line for line in txtfile.read().split("\n") if line.strip()]))
+        else:
+            sources.append((filename, data_handler.read_csv(os.path.join('input_data/', filename))))
+    sources.append(("out_of_scope_data/addresses.csv", data_handler.read_csv('out_of_scope_data/addresses.csv')))
+
+    results = [evaluate_file(label, addresses, parser, comparator, ground_truth) for label, addresses in sources]
+
+    print(f"{'File':<36} {'Bypassed':>10} {'Rate':>7} {'Accuracy':>9} {'us/addr':>8}")
+    for result in results:
+        print(f"{result['file']:<36} {result['bypassed']:>4}/{result['addresses']:<5} {result['bypass_rate']:>7.1%} "
+              f"{result['accuracy']:>9.1%} {result['parse_us_per_address']:>8.1f}")
+
+    stats = parser.stats()
+    correct = sum(result["correct"] for result in results)
+    print(f"Overall: {stats['bypassed']} of {stats['parsed']} addresses bypassed ({stats['bypass_rate']:.1%}), "
+          f"{correct} of {stats['bypassed']} bypassed records match the ground truth exactly; "
+          f"{stats['parsed'] - stats['bypassed']} model calls still needed.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the local address parser against ground_truth.json per input file.")
+    parser.add_argument("--min-confidence", type=float, default=0.8,
+                        help="Confidence needed for a locally parsed address to skip the model.")
+    parser.add_argument("--raw-rows", action="store_true",
+                        help="Parse the raw CSV rows instead of the Step 1 outputs in output_data/.")
+    args = parser.parse_args()
+    main(min_confidence=args.min_confidence, use_raw_rows=args.raw_rows)
@@ -0,0 +1,203 @@
+import io
+import os
+import asyncio
+import argparse
+import datetime
+import contextlib
+import itertools
+from collections import Counter
+from openai import AsyncOpenAI
+from async_openai_processor import AsyncOpenAIProcessor
+from rate_limiter import RequestScheduler
+from data_handler import DataHandler
+from address_comparator import AddressComparator
+from response_cache import ResponseCache
+from llm_backends import AsyncOpenAIBackend, ReplayBackend, LatencyModel
+from telemetry import Telemetry
+
+FIELDS = ["FirstName", "LastName", "StreetName", "Town", "Postcode", "Country", "Missing entry"]
+
+
+def variant_name(separate_version, format_version, model, temperature):
+    """Short label of a variant for the table."""
+    temperature = "default" if temperature is None else temperature
+    return f"sep {separate_version} / fmt {format_version} / {model} / t={temperature}"
+
+
+def make_processor(scheduler, cache, backend, model, temperature):
+    """A processor of its own (so it has its own telemetry) on the shared scheduler and backend."""
+    processor = AsyncOpenAIProcessor(scheduler=scheduler, cache=cache, backend=backend, telemetry=Telemetry())
+    processor.model = model
+    processor.temperature = temperature
+    return processor
+
+
+async def run_matrix(files, separate_versions, format_versions, models, temperatures, scheduler, cache, backend, batch_size=None):
+    """
+    Run every variant over every file under one scheduler.
+    Step 1 runs once per (separate version, model, temperature) and its result is shared by all
+    format versions of that group. Returns (separation processors, format processors, formatted)
+    where formatted maps (variant, filename) to the formatted addresses.
+    """
+    data_handler = DataHandler()
+    rows = {filename: data_handler.read_csv(os.path.join('input_data/', filename)) for filename in files}
+
+    separation_processors = {
+        (separate_version, model, temperature): make_processor(scheduler, cache, backend, model, temperature)
+        for separate_version, model, temperature in itertools.product(separate_versions, models, temperatures)
+    }
+    format_processors = {
+        (separate_version, format_version, model, temperature): make_processor(scheduler, cache, backend, model, temperature)
+        for separate_version, format_version, model, temperature
+        in itertools.product(separate_versions, format_versions, models, temperatures)
+    }
+    formatted = {}
+
+    async def format_variant(variant, filename, separated_addresses):
+        formatted[variant, filename] = await format_processors[variant].format_addresses(
+            separated_addresses, version=variant[1], batch_size=batch_size)
+
+    async def evaluate_file(group, filename):
+        separate_version, model, temperature = group
+        separated_addresses = await separation_processors[group].separate_addresses(rows[filename], version=separate_version)
+        # Start every format version as soon as this file is separated
+        await asyncio.gather(*(
+            format_variant((separate_version, format_version, model, temperature), filename, separated_addresses)
+            for format_version in format_versions
+        ))
+
+    await asyncio.gather(*(evaluate_file(group, filename) for group in separation_processors for filename in files))
+    return separation_processors, format_processors, formatted
+
+
+def score_variant(variant, files, formatted, separation_processor, format_processor, comparator, ground_truth):
+    """Compare a variant's outputs with the ground truth and combine them with its call telemetry."""
+    field_errors = Counter()
+    passes = 0
+    addresses = 0
+    for filename in files:
+        formatted_addresses = formatted.get((variant, filename)) or []
+        addresses += len(formatted_addresses)
+        # compare() prints its own summary; keep the evaluation table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            comparison_report = comparator.compare(formatted_addresses, ground_truth) if formatted_addresses else None
+        if comparison_report is None:
+            field_errors["Missing entry"] += len(ground_truth)
+            continue
+        if not comparison_report:
+            passes += 1
+        for entry in comparison_report:
+            for difference in entry["differences"]:
+                field_errors[difference["field"]] += 1
+
+    separate_calls = separation_processor.telemetry.summary()["calls"].get("separate_addresses", {})
+    format_calls = format_processor.telemetry.summary()["calls"].get("format_addresses", {})
+    # Step 1 is shared by the format versions of a group, but counted in full for each of them
+    # so every row shows what that variant would cost on its own
+    prompt_tokens = separate_calls.get("prompt_tokens", 0) + format_calls.get("prompt_tokens", 0)
+    completion_tokens = separate_calls.get("completion_tokens", 0) + format_calls.get("completion_tokens", 0)
+    cost_usd = separate_calls.get("cost_usd", 0.0) + format_calls.get("cost_usd", 0.0)
+    return {
+        "variant": variant_name(*variant),
+        "separate_version": variant[0],
+        "format_version": variant[1],
+        "model": variant[2],
+        "temperature": variant[3],
+        "files": len(files),
+        "passes": passes,
+        "pass_rate": passes / len(files) if files else 0.0,
+        "addresses": addresses,
+        "field_errors": {field: field_errors[field] for field in FIELDS},
+        "separate_p50_s": separate_calls.get("p50_s", 0.0),
+        "format_p50_s": format_calls.get("p50_s", 0.0),
+        "format_p95_s": format_calls.get("p95_s", 0.0),
+        # Time spent queued on the shared scheduler depends on when a variant ran, so it is kept apart
+        "format_queue_wait_p50_s": format_calls.get("queue_wait", {}).get("p50_s", 0.0),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_per_address": (prompt_tokens + completion_tokens) / addresses if addresses else 0.0,
+        "cost_usd": cost_usd,
+        "cost_per_address_usd": cost_usd / addresses if addresses else 0.0
+    }
+
+
+def print_table(results):
+    field_columns = " ".join(f"{field[:6]:>6}" for field in FIELDS)
+    print(f"{'Variant':<48} {'Pass':>6} {field_columns} {'Sep p50':>8} {'Fmt p50':>8} {'Fmt p95':>8} {'Fmt wait':>8} {'Tok/addr':>9} {'$/1k addr':>10}")
+    for result in sorted(results, key=lambda result: (-result["pass_rate"], result["cost_per_address_usd"])):
+        errors = " ".join(f"{result['field_errors'][field]:>6}" for field in FIELDS)
+        print(f"{result['variant']:<48} {result['pass_rate']:>6.0%} {errors} {result['separate_p50_s']:>8.2f} "
+              f"{result['format_p50_s']:>8.2f} {result['format_p95_s']:>8.2f} {result['format_queue_wait_p50_s']:>8.2f} "
+              f"{result['tokens_per_address']:>9.1f} {result['cost_per_address_usd'] * 1000:>10.4f}")
+
+
+def main(separate_versions, format_versions, models, temperatures, max_concurrency=16, requests_per_minute=500,
+         tokens_per_minute=200000, batch_size=None, cache_mode="bypass", cache_path='.cache/responses.sqlite',
+         backend="openai", output_file=None):
+    """
+    cache_mode: Bypassed by default. Telemetry counts no tokens for cache hits, so with hits served
+    the token and cost columns only show what was not cached and no longer rank the variants.
+    """
+    data_handler = DataHandler()
+    ground_truth = data_handler.read_json('ground_truth.json')
+    if not ground_truth:
+        print("Error: Ground truth file ground_truth.json is missing or invalid.")
+        return
+    comparator = AddressComparator()
+    comparator.build_index(ground_truth)
+    files = sorted(f for f in os.listdir('input_data/') if f.endswith('.csv'))
+
+    # One scheduler and one backend for the whole matrix: the variants share the concurrency budget
+    scheduler = RequestScheduler(max_concurrency=max_concurrency, requests_per_minute=requests_per_minute,
+                                 tokens_per_minute=tokens_per_minute)
+    cache = ResponseCache(cache_path, mode=cache_mode)
+    if backend == "replay":
+        llm_backend = ReplayBackend(latency=LatencyModel("constant", 0.0))
+    else:
+        # Retries are handled by the scheduler, so the client must not retry on its own
+        llm_backend = AsyncOpenAIBackend(AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0))
+
+    separation_processors, format_processors, formatted = asyncio.run(run_matrix(
+        files, separate_versions, format_versions, models, temperatures, scheduler, cache, llm_backend, batch_size))
+    cache.close()
+
+    results = [
+        score_variant(variant, files, formatted, separation_processors[variant[0], variant[2], variant[3]],
+                      format_processor, comparator, ground_truth)
+        for variant, format_processor in format_processors.items()
+    ]
+    print_table(results)
+
+    output_file = output_file or datetime.datetime.now().strftime('output_data/prompt_evaluation_%Y-%m-%d_%H-%M-%S.json')
+    data_handler.save_json(output_file, results)
+    scheduler_stats = scheduler.stats()
+    print(f"{len(results)} variants over {len(files)} files: {scheduler_stats['requests']} requests, "
+          f"{scheduler_stats['retries']} retries. Results saved to {output_file}")
+    if cache_mode in ("readwrite", "readonly"):
+        print(f"Note: cache mode {cache_mode} serves cached responses, which count no tokens; Tok/addr and $/1k addr "
+              f"are only comparable with --cache-mode bypass or refresh.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate every combination of prompt versions (and optionally models and temperatures) on input_data/.")
+    parser.add_argument("--separate-versions", nargs="+", default=["v1", "v2", "v3"], help="separate_addresses prompt versions.")
+    parser.add_argument("--format-versions", nargs="+", default=["v1", "v2", "v3"], help="format_addresses prompt versions.")
+    parser.add_argument("--models", nargs="+", default=["gpt-4o-mini"], help="Models to evaluate.")
+    parser.add_argument("--temperatures", type=float, nargs="+", default=None,
+                        help="Temperatures to evaluate (default: each prompt's own temperature).")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Requests in flight across the whole matrix.")
+    parser.add_argument("--rpm", type=int, default=500, help="Requests per minute limit.")
+    parser.add_argument("--tpm", type=int, default=200000, help="Tokens per minute limit.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Format up to this many addresses per request.")
+    parser.add_argument("--cache-mode", choices=ResponseCache.MODES, default="bypass",
+                        help="How model responses are cached on disk between runs. Bypassed by default, as cached "
+                             "responses count no tokens and would skew the token and cost columns.")
+    parser.add_argument("--cache-path", default='.cache/responses.sqlite', help="Location of the response cache database.")
+    parser.add_argument("--backend", choices=["openai", "replay"], default="openai",
+                        help="Where completions come from (replay answers offline from output_data/).")
+    parser.add_argument("--output", default=None, help="Where to save the JSON results.")
+    args = parser.parse_args()
+    main(args.separate_versions, args.format_versions, args.models, args.temperatures or [None],
+         max_concurrency=args.max_concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+         batch_size=args.batch_size, cache_mode=args.cache_mode, cache_path=args.cache_path,
+         backend=args.backend, output_file=args.output)
@@ -0,0 +1,103 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the chat completions endpoint, for load testing the processors locally.
+    Separation requests echo the input lines; structured output requests split the address on commas.
+    """
+
+    server_version = "FakeOpenAI/0.1"
+
+    def log_message(self, format, *args):
+        # Keep the console quiet under load
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        settings = self.server.settings
+        time.sleep(max(0.0, random.gauss(settings.latency, settings.latency_jitter)))
+
+        if random.random() < settings.rate_limit_rate:
+            self.server.rate_limited += 1
+            self.send_json(429, {"error": {"message": "Rate limit reached (fake server)", "type": "requests"}},
+                           headers={"Retry-After": str(settings.retry_after)})
+            return
+
+        user_content = request["messages"][-1]["content"]
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            if response_format["json_schema"]["name"] == "address_batch_schema":
+                lines = [line.split(". ", 1)[-1] for line in user_content.split("\n") if line.strip()]
+                content = json.dumps({"addresses": [self.parse_address(line) for line in lines]})
+            else:
+                content = json.dumps(self.parse_address(user_content))
+        else:
+            content = user_content
+
+        prompt_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        completion_tokens = len(content) // 4
+        self.send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+    def parse_address(self, text):
+        """Naive 'First Last, Street, Town, Postcode, Country' split."""
+        parts = [part.strip() for part in text.split(",")]
+        parts += [""] * (5 - len(parts))
+        names = parts[0].split(" ", 1) + [""]
+        return {"FirstName": names[0], "LastName": names[1], "StreetName": parts[1],
+                "Town": parts[2], "Postcode": parts[3], "Country": parts[4]}
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_server(port=8089, latency=0.2, latency_jitter=0.05, rate_limit_rate=0.1, retry_after=1):
+    """Start the fake server on a background thread and return it (call shutdown() to stop)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.settings = argparse.Namespace(latency=latency, latency_jitter=latency_jitter,
+                                         rate_limit_rate=rate_limit_rate, retry_after=retry_after)
+    server.rate_limited = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server that injects latency and 429s.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean response latency in seconds.")
+    parser.add_argument("--latency-jitter", type=float, default=0.05, help="Standard deviation of the latency.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.1, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses.")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, args.latency_jitter, args.rate_limit_rate, args.retry_after)
+    print(f"Fake OpenAI server listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
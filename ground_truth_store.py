@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import mmap
+import array
+import struct
+import argparse
+from collections.abc import Sequence
+from address_comparator import SCORED_FIELDS, normalize_record, normalize_postcode, outward_code, inward_code, ngrams
+
+MAGIC = b"GTSTORE3"
+FIELDS = ["FirstName", "LastName", "StreetName", "Town", "Postcode", "Country"]
+# N-gram length of the stored blocking buckets (ComparatorIndex's default)
+NGRAM_SIZE = 3
+# Persisted blocking buckets, keyed by normalized postcode, outward and inward code and field n-grams
+BUCKET_INDEXES = ["postcode", "outward", "inward", "ngram:LastName", "ngram:StreetName"]
+
+
+def blocking_keys(normalized):
+    """The bucket keys of a normalized record, per bucket index (the blocking keys of ComparatorIndex)."""
+    return {
+        "postcode": [normalized['Postcode']],
+        "outward": [outward_code(normalized['Postcode'])],
+        "inward": [inward_code(normalized['Postcode'])] if inward_code(normalized['Postcode']) else [],
+        "ngram:LastName": sorted(ngrams(normalized['LastName'], NGRAM_SIZE)),
+        "ngram:StreetName": sorted(ngrams(normalized['StreetName'], NGRAM_SIZE))
+    }
+
+
+def build_store(ground_truth, path):
+    """
+    Compile a ground truth list into a columnar binary store at path.
+
+    Layout: MAGIC, the header length, a JSON header and 8-byte aligned sections:
+    - strings: one UTF-8 blob of every distinct value plus int64 end offsets (each string stored once)
+    - columns: per field, an int32 string id per record, for the raw and the normalized values
+    - bucket indexes (postcode, outward and inward code, last name and street n-grams): distinct keys (string
+      ids sorted by value), int64 start offsets and the int32 record indices of each key, so a
+      ComparatorIndex over the store needs no in-memory buckets
+    """
+    string_ids = {}
+    strings = []
+
+    def intern(value):
+        string_id = string_ids.get(value)
+        if string_id is None:
+            string_id = string_ids[value] = len(strings)
+            strings.append(value)
+        return string_id
+
+    columns = {field: array.array('i', (intern(truth_addr.get(field, "")) for truth_addr in ground_truth)) for field in FIELDS}
+    normalized = {field: array.array('i') for field in SCORED_FIELDS}
+    buckets = {name: {} for name in BUCKET_INDEXES}
+    for idx, truth_addr in enumerate(ground_truth):
+        normalized_addr = normalize_record(truth_addr)
+        for field in SCORED_FIELDS:
+            normalized[field].append(intern(normalized_addr[field]))
+        for name, keys in blocking_keys(normalized_addr).items():
+            for key in keys:
+                buckets[name].setdefault(intern(key), []).append(idx)
+
+    bucket_sections = []
+    for name in BUCKET_INDEXES:
+        keys = array.array('i', sorted(buckets[name], key=lambda string_id: strings[string_id]))
+        starts = array.array('q', [0])
+        records = array.array('i')
+        for string_id in keys:
+            records.extend(buckets[name][string_id])
+            starts.append(len(records))
+        bucket_sections += [(f"{name}_keys", keys.tobytes()), (f"{name}_starts", starts.tobytes()),
+                            (f"{name}_records", records.tobytes())]
+
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = array.array('q', [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    sections = [("string_offsets", string_offsets.tobytes()), ("string_blob", b"".join(encoded))]
+    sections += [(f"column:{field}", column.tobytes()) for field, column in columns.items()]
+    sections += [(f"normalized:{field}", column.tobytes()) for field, column in normalized.items()]
+    sections += bucket_sections
+
+    # Section offsets are relative to the end of the header, so the header can be written first
+    offsets = {}
+    position = 0
+    for name, data in sections:
+        offsets[name] = [position, len(data)]
+        position += len(data) + (-len(data) % 8)
+    header = json.dumps({
+        "count": len(ground_truth),
+        "strings": len(strings),
+        "ngram_size": NGRAM_SIZE,
+        "sections": offsets
+    }).encode('utf-8')
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as storefile:
+        storefile.write(MAGIC)
+        storefile.write(struct.pack('<Q', len(header)))
+        storefile.write(header)
+        for _, data in sections:
+            storefile.write(data)
+            storefile.write(b"\0" * (-len(data) % 8))
+    os.replace(temporary_path, path)
+
+
+class GroundTruthStore(Sequence):
+    """
+    Read-only view of a store written by build_store, memory-mapped so loading is near instant
+    and records are only decoded when used.
+
+    It is a sequence of ground truth dicts, so it can be passed anywhere the ground truth list is
+    used. AddressComparator and its scorers also read the pre-normalized columns (normalized,
+    normalized_column) and the blocking buckets (bucket) directly, and worker processes can each map
+    the same file instead of holding their own copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a ground truth store of this version, rebuild it with ground_truth_store.py.")
+        header_length, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        data_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[data_start:data_start + header_length])
+        self.count = header["count"]
+        self.ngram_size = header["ngram_size"]
+        self._base = data_start + header_length
+        self._sections = header["sections"]
+        self._view = memoryview(self._mmap)
+
+        self._string_offsets = self._array("string_offsets", 'q')
+        blob_start, _ = self._sections["string_blob"]
+        self._blob_start = self._base + blob_start
+        self._columns = {field: self._array(f"column:{field}", 'i') for field in FIELDS}
+        self._normalized = {field: self._array(f"normalized:{field}", 'i') for field in SCORED_FIELDS}
+        self._buckets = {name: (self._array(f"{name}_keys", 'i'), self._array(f"{name}_starts", 'q'),
+                                self._array(f"{name}_records", 'i'))
+                         for name in BUCKET_INDEXES}
+
+    def _array(self, name, typecode):
+        """Zero-copy typed view of a section."""
+        start, length = self._sections[name]
+        return self._view[self._base + start:self._base + start + length].cast(typecode)
+
+    def string(self, string_id):
+        start = self._blob_start + self._string_offsets[string_id]
+        end = self._blob_start + self._string_offsets[string_id + 1]
+        return str(self._mmap[start:end], 'utf-8')
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self.count))]
+        if idx < 0:
+            idx += self.count
+        if not 0 <= idx < self.count:
+            raise IndexError("ground truth index out of range")
+        return {field: self.string(column[idx]) for field, column in self._columns.items()}
+
+    def normalized(self, idx):
+        """The scored fields of a record, already lowercased (postcode without spaces)."""
+        return {field: self.string(column[idx]) for field, column in self._normalized.items()}
+
+    def normalized_column(self, field):
+        """Every record's normalized value of a scored field."""
+        column = self._normalized[field]
+        return [self.string(string_id) for string_id in column]
+
+    def bucket(self, name, key):
+        """
+        Record indices of one key of a bucket index (see BUCKET_INDEXES), found by binary search.
+        A zero-copy view into the file: it supports len() and iteration, tolist() makes a list.
+        """
+        keys, starts, records = self._buckets[name]
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self.string(keys[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(keys) or self.string(keys[low]) != key:
+            return records[0:0]
+        return records[starts[low]:starts[low + 1]]
+
+    def postcode_indices(self, postcode):
+        """Record indices whose normalized postcode equals the normalized postcode given."""
+        return self.bucket("postcode", normalize_postcode(postcode)).tolist()
+
+    def close(self):
+        views = [getattr(self, "_string_offsets", None)]
+        views += list(getattr(self, "_columns", {}).values()) + list(getattr(self, "_normalized", {}).values())
+        for bucket_views in getattr(self, "_buckets", {}).values():
+            views += bucket_views
+        for view in views:
+            if view is not None:
+                view.release()
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a ground truth JSON file into a memory-mappable store.")
+    parser.add_argument("source", nargs="?", default='ground_truth.json', help="Ground truth JSON file.")
+    parser.add_argument("target", nargs="?", default='ground_truth.gtstore', help="Store file to write.")
+    args = parser.parse_args()
+
+    from data_handler import DataHandler
+
+    ground_truth = DataHandler().read_json(args.source)
+    if not ground_truth:
+        print(f"Error: Ground truth file {args.source} is missing or invalid.")
+        sys.exit(1)
+    build_store(ground_truth, args.target)
+    print(f"Wrote {len(ground_truth)} records to {args.target} ({os.path.getsize(args.target)} bytes)")
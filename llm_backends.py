@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from data_handler import DataHandler
+from local_parser import LocalAddressParser
+
+
+def response_usage(response):
+    """Token counts reported on a chat completion response, if any."""
+    if getattr(response, "usage", None) is None:
+        return None
+    return {
+        "prompt_tokens": response.usage.prompt_tokens,
+        "completion_tokens": response.usage.completion_tokens
+    }
+
+
+class LLMBackend:
+    """
+    Interface between the processors and whatever answers chat completions.
+
+    complete() is used by OpenAIProcessor and acomplete() by AsyncOpenAIProcessor. Both take the
+    model name, the chat messages and the request params, and return (content, usage) where usage
+    is a dict with prompt_tokens and completion_tokens, or None if unknown.
+
+    name identifies the backend in response cache keys, so answers of one backend (e.g. replayed
+    ones) are never served to a run on another.
+    """
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def complete(self, model, messages, **params):
+        raise NotImplementedError
+
+    async def acomplete(self, model, messages, **params):
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """Backend for a synchronous OpenAI(-compatible) client."""
+
+    name = "openai"
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, model, messages, **params):
+        response = self.client.chat.completions.create(model=model, messages=messages, **params)
+        return response.choices[0].message.content, response_usage(response)
+
+
+class AsyncOpenAIBackend(LLMBackend):
+    """Backend for an AsyncOpenAI(-compatible) client."""
+
+    name = "openai"
+
+    def __init__(self, client):
+        self.client = client
+
+    async def acomplete(self, model, messages, **params):
+        response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+        return response.choices[0].message.content, response_usage(response)
+
+
+class SimulatedRateLimitError(Exception):
+    """Injected by ReplayBackend; retryable by RequestScheduler like a real 429."""
+
+    retryable = True
+
+    def __init__(self, retry_after=None):
+        super().__init__("Rate limit reached (simulated)")
+        self.retry_after = retry_after
+
+
+class LatencyModel:
+    """
+    Latency distribution for simulated calls, in seconds.
+
+    kind: "constant" (always mean), "uniform" (between 0 and 2 x mean) or "lognormal"
+    (median mean, sigma controls the tail).
+    """
+
+    KINDS = ("constant", "uniform", "lognormal")
+
+    def __init__(self, kind="lognormal", mean=0.5, sigma=0.5, rng=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}', expected one of {', '.join(self.KINDS)}.")
+        self.kind = kind
+        self.mean = mean
+        self.sigma = sigma
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        if self.kind == "constant":
+            return self.mean
+        if self.kind == "uniform":
+            return self.rng.uniform(0, 2 * self.mean)
+        return self.rng.lognormvariate(0, self.sigma) * self.mean if self.mean > 0 else 0.0
+
+
+def normalize_text(text):
+    """Lowercase alphanumerics only, to match separated addresses with their formatted records."""
+    return re.sub(r'[^0-9a-z]+', '', text.lower())
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Offline backend that answers from a previous run's outputs instead of calling the API.
+
+    Separation requests are answered with the recorded *_step1.txt of the input file whose rows
+    they contain; format requests with the *_step2.json record of that address. Anything not in the
+    recordings (e.g. streamed chunks or edited inputs) falls back to echoing the rows for separation
+    and to LocalAddressParser for formatting, so the replay never blocks a run; misses counts them,
+    as a run with misses does not reproduce the recorded results. Requests are looked up by their exact
+    content first, then by their letters and digits only, where content recorded for several files
+    (e.g. 9_no_spaces and 1_standard) is answered with the first recording.
+
+    latency: A LatencyModel applied to every call.
+    error_rate: Fraction of calls that fail with SimulatedRateLimitError.
+    """
+
+    name = "replay"
+
+    def __init__(self, recordings_dir='output_data', input_dir='input_data', latency=None, error_rate=0.0,
+                 retry_after=0.5, seed=None):
+        self.rng = random.Random(seed)
+        self.latency = latency or LatencyModel("constant", 0.0)
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.parser = LocalAddressParser()
+        # Exact and normalized (normalize_text) request content -> separated addresses / formatted record
+        self.separations = ({}, {})
+        self.formats = ({}, {})
+        self.calls = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.load(recordings_dir, input_dir)
+
+    def load(self, recordings_dir, input_dir):
+        """Index the recorded Step 1 / Step 2 outputs by the request content they answer."""
+        data_handler = DataHandler()
+        if not os.path.isdir(input_dir):
+            return
+        for filename in sorted(os.listdir(input_dir)):
+            if not filename.endswith('.csv'):
+                continue
+            base_filename = os.path.splitext(filename)[0]
+            step1_file = os.path.join(recordings_dir, f"{base_filename}_step1.txt")
+            step2_file = os.path.join(recordings_dir, f"{base_filename}_step2.json")
+            if not os.path.exists(step1_file):
+                continue
+
+            with open(step1_file, 'r', encoding='utf-8') as txtfile:
+                separated = [line for line in txtfile.read().split("\n") if line.strip()]
+            rows = list(data_handler.iter_csv(os.path.join(input_dir, filename)))
+            self.remember(self.separations, "\n".join(rows), separated)
+
+            records = (data_handler.read_json(step2_file) if os.path.exists(step2_file) else None) or []
+            for address in separated:
+                record = self.match_record(address, records)
+                if record is not None:
+                    self.remember(self.formats, address.strip().strip('"'), record)
+
+    def remember(self, table, content, answer):
+        """Index an answer by its exact and its normalized content; the first recording wins."""
+        table[0].setdefault(content, answer)
+        table[1].setdefault(normalize_text(content), answer)
+
+    def recall(self, table, content):
+        """The recorded answer to request content, None if it was not recorded."""
+        answer = table[0].get(content.strip().strip('"'))
+        return answer if answer is not None else table[1].get(normalize_text(content))
+
+    def match_record(self, address, records):
+        """The recorded record whose field values appear in the address (Step 2 output is not in Step 1 order)."""
+        normalized_address = normalize_text(address)
+        best_record = None
+        best_hits = 0
+        for record in records:
+            hits = sum(1 for value in record.values() if value and normalize_text(value) in normalized_address)
+            if hits > best_hits:
+                best_record, best_hits = record, hits
+        return best_record if best_hits >= 4 else None
+
+    def answer(self, messages, params):
+        """The replayed content for a request."""
+        user_content = messages[-1]["content"]
+        response_format = params.get("response_format") or {}
+        if response_format.get("type") != "json_schema":
+            separated = self.recall(self.separations, user_content)
+            if separated is None:
+                with self._lock:
+                    self.misses += 1
+                # Drop a header row the way the model would and echo the rest
+                separated = [row for row in user_content.split("\n") if row.strip() and not row.lower().startswith("firstname")]
+            return "\n".join(separated)
+
+        if response_format["json_schema"]["name"] == "address_batch_schema":
+            lines = [re.sub(r'^\d+\.\s*', '', line) for line in user_content.split("\n") if line.strip()]
+            return json.dumps({"addresses": [self.format_record(line) for line in lines]})
+        return json.dumps(self.format_record(user_content))
+
+    def format_record(self, address):
+        record = self.recall(self.formats, address)
+        if record is not None:
+            return record
+        with self._lock:
+            self.misses += 1
+        parsed, _ = self.parser.parse(address)
+        return parsed or {"FirstName": "", "LastName": "", "StreetName": address, "Town": "", "Postcode": "", "Country": ""}
+
+    def usage(self, messages, content):
+        """Rough token counts (four characters per token) so telemetry and rate limiting have numbers to work with."""
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4 + 1
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4 + 1}
+
+    def simulate(self):
+        """Draw this call's latency and whether it fails."""
+        with self._lock:
+            self.calls += 1
+            return self.latency.sample(), self.rng.random() < self.error_rate
+
+    def complete(self, model, messages, **params):
+        delay, fail = self.simulate()
+        time.sleep(delay)
+        if fail:
+            raise SimulatedRateLimitError(self.retry_after)
+        content = self.answer(messages, params)
+        return content, self.usage(messages, content)
+
+    async def acomplete(self, model, messages, **params):
+        delay, fail = self.simulate()
+        await asyncio.sleep(delay)
+        if fail:
+            raise SimulatedRateLimitError(self.retry_after)
+        content = self.answer(messages, params)
+        return content, self.usage(messages, content)
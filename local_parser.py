@@ -0,0 +1,234 @@
+import re
+import threading
+
+# UK postcode format: outward code (area + district) and inward code (sector + unit).
+# Only the shape is checked; the stricter letter rules would reject some synthetic test data.
+POSTCODE_PATTERN = re.compile(r'^([A-Z]{1,2}[0-9][A-Z0-9]?)\s*([0-9][A-Z]{2})$', re.IGNORECASE)
+POSTCODE_AT_END_PATTERN = re.compile(r'([A-Z]{1,2}[0-9][A-Z0-9]?)\s*([0-9][A-Z]{2})$')
+
+# Country names and codes we expect to see, mapped to the ISO code used in the ground truth
+COUNTRY_CODES = {
+    "gb": "GB", "uk": "GB", "united kingdom": "GB", "great britain": "GB", "england": "GB",
+    "scotland": "GB", "wales": "GB", "northern ireland": "GB",
+    "ie": "IE", "ireland": "IE",
+    "fr": "FR", "france": "FR",
+    "de": "DE", "germany": "DE",
+    "es": "ES", "spain": "ES",
+    "nl": "NL", "netherlands": "NL",
+    "us": "US", "usa": "US", "united states": "US",
+}
+
+# Last word of a street name, used to find where the street ends in undelimited text
+STREET_SUFFIXES = {
+    "street", "road", "lane", "avenue", "drive", "close", "way", "place", "square", "crescent",
+    "terrace", "grove", "gardens", "court", "hill", "park", "row", "walk", "view", "mews", "parade", "green"
+}
+
+# Splits "JohnSmith221BBakerStreet" into ["John", "Smith", "221B", "Baker", "Street"]
+SQUASHED_TOKEN_PATTERN = re.compile(r'[0-9]+[A-Z]?(?=[A-Z][a-z]|$)|[0-9]+|[A-Z][a-z\'-]+|[A-Z]+(?![a-z])')
+
+# Confidence lost when a UK-shaped postcode comes with another country
+UK_POSTCODE_ELSEWHERE_PENALTY = 0.5
+
+FIELD_DELIMITERS = re.compile(r'\t|,|;|\|')
+STRIP_CHARACTERS = " \t\"'*!-•·_#"
+
+
+def normalize_case(value):
+    """Title-case words that came in all upper or all lower case, leave mixed case words alone."""
+    return " ".join(word.title() if word.isupper() or word.islower() else word for word in value.split(" "))
+
+
+def format_postcode(outward, inward):
+    """Postcode in the canonical 'OUTWARD INWARD' form."""
+    return f"{outward.upper()} {inward.upper()}"
+
+
+def country_code(value):
+    """ISO code for a country name or code, or None if it is not in COUNTRY_CODES."""
+    return COUNTRY_CODES.get(re.sub(r'\s+', ' ', value.strip(STRIP_CHARACTERS)).lower())
+
+
+class LocalAddressParser:
+    """
+    Deterministic parser for well-formed addresses, used as a fast path in front of the model.
+
+    parse() maps an address string to the FirstName/LastName/StreetName/Town/Postcode/Country
+    record and a confidence between 0 and 1. Delimited addresses ("First Last, Street, Town,
+    Postcode, Country" and column layouts) score high; undelimited ones (squashed or space
+    separated) rely on street suffixes to split street from town and score lower.
+
+    min_confidence: Records at or above this confidence bypass the model.
+    """
+
+    def __init__(self, min_confidence=0.8):
+        self.min_confidence = min_confidence
+        self.parsed = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+
+    def parse(self, address):
+        """Return (record, confidence) for an address string, or (None, 0.0) if it cannot be parsed."""
+        text = address.strip().strip(STRIP_CHARACTERS)
+        if not text:
+            return None, 0.0
+
+        fields = [field.strip(STRIP_CHARACTERS) for field in FIELD_DELIMITERS.split(text)]
+        fields = [re.sub(r'\s+', ' ', field) for field in fields if field.strip(STRIP_CHARACTERS)]
+        if len(fields) >= 3:
+            return self.parse_delimited(fields)
+        return self.parse_undelimited(re.sub(r'\s+', ' ', text))
+
+    def parse_delimited(self, fields):
+        """Parse an address already split into fields."""
+        postcode_position = next((i for i, field in enumerate(fields) if POSTCODE_PATTERN.match(field)), None)
+        if postcode_position is None:
+            return None, 0.0
+
+        confidence = 1.0
+        outward, inward = POSTCODE_PATTERN.match(fields[postcode_position]).groups()
+
+        trailing = fields[postcode_position + 1:]
+        country = country_code(trailing[0]) if trailing else None
+        if country:
+            trailing = trailing[1:]
+        else:
+            # A UK postcode without a country is almost certainly GB
+            country = "GB"
+            confidence -= 0.15
+        if trailing:
+            # Extra columns such as notes or delivery dates
+            confidence -= 0.05
+        if country != "GB":
+            # POSTCODE_PATTERN only knows UK postcodes, so another country means something is off
+            confidence -= UK_POSTCODE_ELSEWHERE_PENALTY
+
+        leading = fields[:postcode_position]
+        street_position = next((i for i, field in enumerate(leading) if re.match(r'^[0-9]', field)), None)
+        if street_position is None:
+            # Without a house number we cannot tell the street from the name
+            return None, 0.0
+
+        names = leading[:street_position]
+        towns = leading[street_position + 1:]
+        if len(towns) != 1:
+            return None, 0.0
+
+        if len(names) == 1:
+            name_parts = names[0].split(" ", 1)
+            if len(name_parts) < 2:
+                return None, 0.0
+            first_name, last_name = name_parts
+            if " " in last_name:
+                # Middle names make the first/last split a guess
+                confidence -= 0.3
+        elif len(names) == 2:
+            first_name, last_name = names
+            if " " in first_name or " " in last_name:
+                # Two fields of several words each: probably not first name, last name
+                confidence -= 0.5
+        else:
+            return None, 0.0
+        if any(char.isdigit() for char in first_name + last_name):
+            # A flat or building number ("Flat 2") was taken for a name
+            return None, 0.0
+
+        record = {
+            "FirstName": normalize_case(first_name),
+            "LastName": normalize_case(last_name),
+            "StreetName": normalize_case(leading[street_position]),
+            "Town": normalize_case(towns[0]),
+            "Postcode": format_postcode(outward, inward),
+            "Country": country
+        }
+        return record, max(confidence, 0.0)
+
+    def parse_undelimited(self, text):
+        """Parse a squashed ('JohnSmith221BBakerStreet...') or space separated address."""
+        confidence = 0.85
+
+        country = None
+        if " " in text:
+            words = text.split(" ")
+            country = country_code(words[-1])
+            if country:
+                text = " ".join(words[:-1])
+        else:
+            match = re.search(r'([A-Z]{2})$', text)
+            if match and country_code(match.group(1)):
+                country = country_code(match.group(1))
+                text = text[:match.start()]
+        if not country:
+            country = "GB"
+            confidence -= 0.15
+        elif country != "GB":
+            confidence -= UK_POSTCODE_ELSEWHERE_PENALTY
+
+        match = POSTCODE_AT_END_PATTERN.search(text.upper() if " " in text else text)
+        if not match:
+            return None, 0.0
+        outward, inward = match.groups()
+        remainder = text[:match.start()].strip()
+
+        if " " in remainder:
+            tokens = remainder.split(" ")
+        else:
+            tokens = SQUASHED_TOKEN_PATTERN.findall(remainder)
+            if "".join(tokens) != remainder:
+                return None, 0.0
+
+        number_position = next((i for i, token in enumerate(tokens) if token[0].isdigit()), None)
+        if number_position is None or number_position < 2:
+            return None, 0.0
+        if number_position > 2:
+            # More than two name words: the first/last split is a guess
+            confidence -= 0.3
+
+        suffix_position = None
+        for i in range(len(tokens) - 2, number_position, -1):
+            if tokens[i].lower() in STREET_SUFFIXES:
+                suffix_position = i
+                break
+        if suffix_position is None:
+            # No street suffix: assume a one word street ("90 Kingsway") and a one word town
+            suffix_position = number_position + 1
+            confidence -= 0.35
+        if suffix_position >= len(tokens) - 1:
+            return None, 0.0
+
+        record = {
+            "FirstName": normalize_case(tokens[0]),
+            "LastName": normalize_case(" ".join(tokens[1:number_position])),
+            "StreetName": normalize_case(" ".join(tokens[number_position:suffix_position + 1])),
+            "Town": normalize_case(" ".join(tokens[suffix_position + 1:])),
+            "Postcode": format_postcode(outward, inward),
+            "Country": country
+        }
+        return record, max(confidence, 0.0)
+
+    def split(self, addresses):
+        """
+        Parse addresses locally. Returns (records, remaining): records parsed with enough
+        confidence to skip the model, and the addresses that still need the model.
+        """
+        records = []
+        remaining = []
+        for address in addresses:
+            record, confidence = self.parse(address)
+            if record is not None and confidence >= self.min_confidence:
+                records.append(record)
+            else:
+                remaining.append(address)
+        with self._lock:
+            self.parsed += len(addresses)
+            self.bypassed += len(records)
+        return records, remaining
+
+    def stats(self):
+        """Bypass counters for the test report."""
+        with self._lock:
+            return {
+                "parsed": self.parsed,
+                "bypassed": self.bypassed,
+                "bypass_rate": self.bypassed / self.parsed if self.parsed else 0.0
+            }
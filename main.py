@@ -1,66 +1,394 @@
 import os
+import asyncio
+import argparse
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from openai_processor import OpenAIProcessor
+from async_openai_processor import AsyncOpenAIProcessor
+from rate_limiter import RequestScheduler
 from data_handler import DataHandler
 from address_comparator import AddressComparator
+from response_cache import ResponseCache
+from local_parser import LocalAddressParser
+from telemetry import Telemetry
+from llm_backends import ReplayBackend, LatencyModel
+from run_manifest import RunManifest, hash_file
+from pipeline import Stage, StagedPipeline
+from results_sink import ResultsSink
+from request_dedup import RequestDeduplicator
 
-def process_single_file(filename, processor, data_handler, comparator, ground_truth):
+def stream_separate_and_format(input_file, processor, data_handler, batch_size=None, max_chunks_in_flight=4):
+    """
+    Read the CSV lazily, separate it chunk by chunk and start formatting each chunk as soon as it is
+    separated. At most max_chunks_in_flight chunks are being formatted while the next one is separated.
+    Returns (separated_addresses, formatted_addresses).
+    """
+    separated_addresses = []
+    formatted_addresses = []
+    with ThreadPoolExecutor(max_workers=max_chunks_in_flight) as executor:
+        pending = set()
+        for chunk in processor.separate_addresses_stream(data_handler.iter_csv(input_file), version="v1"):
+            if not chunk:
+                continue
+            separated_addresses.extend(chunk)
+            pending.add(executor.submit(processor.format_addresses, chunk, version="v1", batch_size=batch_size))
+            # Backpressure: do not run further ahead than max_chunks_in_flight chunks
+            if len(pending) >= max_chunks_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    formatted_addresses.extend(future.result())
+        for future in as_completed(pending):
+            formatted_addresses.extend(future.result())
+    return separated_addresses, formatted_addresses
+
+def compare_with_profiling(comparator, formatted_addresses, ground_truth, comparison_stats, telemetry, base_filename):
+    """Run the comparison under the telemetry's profiler (if one is configured)."""
+    with telemetry.profile(f"compare_{base_filename}"):
+        return comparator.compare(formatted_addresses, ground_truth, stats=comparison_stats)
+
+def comparison_result(filename, comparison_report, comparison_stats):
+    """Pass/fail result of a file from its comparison report."""
+    if not comparison_report:
+        return {"filename": filename, "status": "PASS", "comparison_stats": comparison_stats}
+    else:
+        return {"filename": filename, "status": "FAILED", "reason": f"{len(comparison_report)} differences found",
+                "comparison_stats": comparison_stats}
+
+def record_result(results_sink, result, comparison_report=None):
+    """Append a file's result to the run dataset (if one is being written) and return it."""
+    if results_sink is not None:
+        results_sink.add(result, comparison_report)
+    return result
+
+def process_single_file(filename, processor, data_handler, comparator, ground_truth, batch_size=None, stream=False, telemetry=None,
+                        input_dir='input_data/', output_dir='output_data/', manifest=None, results_sink=None):
     """
     Process a single file: separate addresses, format them, and compare with ground truth.
+    With stream set, the file is separated in chunks and formatting overlaps with separation.
+    Stage timings are recorded in telemetry when given.
+    With a RunManifest, stored outputs are reused for whatever has not changed since the last run.
+    With a ResultsSink, the result and its differences are appended to the run dataset as soon as the file is done.
     Returns a dictionary with the filename, pass/fail status, and any differences.
     """
-    input_dir = 'input_data/'
+    telemetry = telemetry or Telemetry()
     base_filename = os.path.splitext(filename)[0]
-    step1_output_file = f'output_data/{base_filename}_step1.txt'
-    step2_output_file = f'output_data/{base_filename}_step2.json'
-    comparison_results_file = f'output_data/{base_filename}_comparison_results.json'
+    step1_output_file = os.path.join(output_dir, f'{base_filename}_step1.txt')
+    step2_output_file = os.path.join(output_dir, f'{base_filename}_step2.json')
+    comparison_results_file = os.path.join(output_dir, f'{base_filename}_comparison_results.json')
+
+    input_file = os.path.join(input_dir, filename)
+
+    llm_key, compare_key = manifest.keys(input_file) if manifest else (None, None)
+    plan = manifest.plan(filename, llm_key, compare_key, step2_output_file, comparison_results_file) if manifest else "full"
+    if plan == "reuse":
+        print(f"Unchanged, reusing stored results: {filename}")
+        return record_result(results_sink, manifest.result(filename), data_handler.read_json(comparison_results_file))
 
     print(f"Processing file: {filename}")
 
-    input_file = os.path.join(input_dir, filename)
+    if plan == "compare":
+        # Inputs, prompts and model unchanged: only the comparison has to be redone
+        with telemetry.stage("read", filename):
+            formatted_addresses = data_handler.read_json(step2_output_file)
+    elif stream:
+        # Steps 1-3 overlapped: read lazily, separate chunk by chunk, format each chunk straight away
+        with telemetry.stage("separate_and_format", filename):
+            separated_addresses, formatted_addresses = stream_separate_and_format(input_file, processor, data_handler, batch_size)
+        if not separated_addresses:
+            print(f"Error: Failed to separate addresses in {filename}.")
+            return {"filename": filename, "status": "FAILED", "reason": "Address separation error"}
+        with telemetry.stage("write", filename):
+            data_handler.save_txt(step1_output_file, separated_addresses)
+    else:
+        # Step 1: Read the input CSV file
+        with telemetry.stage("read", filename):
+            input_addresses = data_handler.read_csv(input_file)
+        if not input_addresses:
+            print(f"Error: No addresses found in {filename}. Skipping file.")
+            return {"filename": filename, "status": "FAILED", "reason": "No addresses found"}
 
-    # Step 1: Read the input CSV file
-    input_addresses = data_handler.read_csv(input_file)
-    if not input_addresses:
-        print(f"Error: No addresses found in {filename}. Skipping file.")
-        return {"filename": filename, "status": "FAILED", "reason": "No addresses found"}
+        # Step 2: Separate the addresses (Step 1)
+        with telemetry.stage("separate", filename):
+            separated_addresses = processor.separate_addresses(input_addresses, version="v1")
+        if not separated_addresses:
+            print(f"Error: Failed to separate addresses in {filename}.")
+            return {"filename": filename, "status": "FAILED", "reason": "Address separation error"}
 
-    # Step 2: Separate the addresses (Step 1)
-    separated_addresses = processor.separate_addresses(input_addresses, version="v1")
-    if not separated_addresses:
-        print(f"Error: Failed to separate addresses in {filename}.")
-        return {"filename": filename, "status": "FAILED", "reason": "Address separation error"}
+        with telemetry.stage("write", filename):
+            data_handler.save_txt(step1_output_file, separated_addresses)
 
-    data_handler.save_txt(step1_output_file, separated_addresses)
+        # Step 3: Format the addresses (Step 2)
+        with telemetry.stage("format", filename):
+            formatted_addresses = processor.format_addresses(separated_addresses, version="v1", batch_size=batch_size)
 
-    # Step 3: Format the addresses (Step 2)
-    formatted_addresses = processor.format_addresses(separated_addresses, version="v1")
     if not formatted_addresses:
         print(f"Error: Failed to format addresses in {filename}.")
         return {"filename": filename, "status": "FAILED", "reason": "Address formatting error"}
 
-    data_handler.save_json(step2_output_file, formatted_addresses)
+    if plan != "compare":
+        with telemetry.stage("write", filename):
+            data_handler.save_json(step2_output_file, formatted_addresses)
 
     # Step 4: Compare with the ground truth
-    comparison_report = comparator.compare(formatted_addresses, ground_truth)
-    data_handler.save_json(comparison_results_file, comparison_report)
+    comparison_stats = {}
+    with telemetry.stage("compare", filename):
+        comparison_report = compare_with_profiling(comparator, formatted_addresses, ground_truth, comparison_stats, telemetry, base_filename)
+    with telemetry.stage("write", filename):
+        data_handler.save_json(comparison_results_file, comparison_report)
 
     # Determine if test passed or failed
-    if not comparison_report:
-        return {"filename": filename, "status": "PASS"}
+    result = comparison_result(filename, comparison_report, comparison_stats)
+    if manifest is not None:
+        manifest.record(filename, llm_key, compare_key, result)
+    return record_result(results_sink, result, comparison_report)
+
+async def process_single_file_async(filename, processor, data_handler, comparator, ground_truth, batch_size=None, telemetry=None,
+                                    input_dir='input_data/', output_dir='output_data/', manifest=None, results_sink=None):
+    """
+    Async version of process_single_file for use with AsyncOpenAIProcessor.
+    Model calls share the processor's scheduler; disk I/O and comparison run in worker threads.
+    """
+    telemetry = telemetry or Telemetry()
+    base_filename = os.path.splitext(filename)[0]
+    step1_output_file = os.path.join(output_dir, f'{base_filename}_step1.txt')
+    step2_output_file = os.path.join(output_dir, f'{base_filename}_step2.json')
+    comparison_results_file = os.path.join(output_dir, f'{base_filename}_comparison_results.json')
+
+    input_file = os.path.join(input_dir, filename)
+
+    llm_key, compare_key = await asyncio.to_thread(manifest.keys, input_file) if manifest else (None, None)
+    plan = manifest.plan(filename, llm_key, compare_key, step2_output_file, comparison_results_file) if manifest else "full"
+    if plan == "reuse":
+        print(f"Unchanged, reusing stored results: {filename}")
+        comparison_report = await asyncio.to_thread(data_handler.read_json, comparison_results_file)
+        return await asyncio.to_thread(record_result, results_sink, manifest.result(filename), comparison_report)
+
+    print(f"Processing file: {filename}")
+
+    if plan == "compare":
+        with telemetry.stage("read", filename):
+            formatted_addresses = await asyncio.to_thread(data_handler.read_json, step2_output_file)
     else:
-        return {"filename": filename, "status": "FAILED", "reason": f"{len(comparison_report)} differences found"}
+        with telemetry.stage("read", filename):
+            input_addresses = await asyncio.to_thread(data_handler.read_csv, input_file)
+        if not input_addresses:
+            print(f"Error: No addresses found in {filename}. Skipping file.")
+            return {"filename": filename, "status": "FAILED", "reason": "No addresses found"}
+
+        with telemetry.stage("separate", filename):
+            separated_addresses = await processor.separate_addresses(input_addresses, version="v1")
+        if not separated_addresses:
+            print(f"Error: Failed to separate addresses in {filename}.")
+            return {"filename": filename, "status": "FAILED", "reason": "Address separation error"}
+
+        with telemetry.stage("write", filename):
+            await asyncio.to_thread(data_handler.save_txt, step1_output_file, separated_addresses)
+
+        with telemetry.stage("format", filename):
+            formatted_addresses = await processor.format_addresses(separated_addresses, version="v1", batch_size=batch_size)
+    if not formatted_addresses:
+        print(f"Error: Failed to format addresses in {filename}.")
+        return {"filename": filename, "status": "FAILED", "reason": "Address formatting error"}
+
+    if plan != "compare":
+        with telemetry.stage("write", filename):
+            await asyncio.to_thread(data_handler.save_json, step2_output_file, formatted_addresses)
+
+    comparison_stats = {}
+    with telemetry.stage("compare", filename):
+        comparison_report = await asyncio.to_thread(compare_with_profiling, comparator, formatted_addresses, ground_truth,
+                                                    comparison_stats, telemetry, base_filename)
+    with telemetry.stage("write", filename):
+        await asyncio.to_thread(data_handler.save_json, comparison_results_file, comparison_report)
+
+    result = comparison_result(filename, comparison_report, comparison_stats)
+    if manifest is not None:
+        manifest.record(filename, llm_key, compare_key, result)
+    return await asyncio.to_thread(record_result, results_sink, result, comparison_report)
+
+async def process_files_async(all_files, processor, data_handler, comparator, ground_truth, batch_size=None, telemetry=None,
+                              input_dir='input_data/', output_dir='output_data/', manifest=None, results_sink=None):
+    """Process every file concurrently; the shared scheduler caps requests across all of them."""
+    results = await asyncio.gather(
+        *(process_single_file_async(filename, processor, data_handler, comparator, ground_truth, batch_size, telemetry,
+                                    input_dir, output_dir, manifest, results_sink) for filename in all_files),
+        return_exceptions=True
+    )
+    for filename, result in zip(all_files, results):
+        if isinstance(result, Exception):
+            print(f"Error processing file {filename}: {str(result)}")
+    return [
+        result if not isinstance(result, Exception) else {"filename": filename, "status": "FAILED", "reason": str(result)}
+        for filename, result in zip(all_files, results)
+    ]
 
-def main():
+# Worker threads per stage of the pipelined mode
+DEFAULT_STAGE_WORKERS = {"read": 2, "separate": 4, "format": 8, "compare": 2, "write": 2}
+
+def process_files_pipelined(all_files, processor, data_handler, comparator, ground_truth, batch_size=None, stream=False,
+                            telemetry=None, stage_workers=None, queue_size=16, readout_interval=None,
+                            input_dir='input_data/', output_dir='output_data/', manifest=None, results_sink=None):
+    """
+    Process files through a StagedPipeline: read -> separate -> format -> compare -> write, each stage
+    with its own worker threads and a bounded input queue. With stream set, files are separated in
+    chunks and each chunk is formatted while the rest of its file is still being separated. The
+    format workers share one model call pool of the same size, so at most that many format
+    requests are in flight however many addresses each chunk holds.
+    Returns (results, pipeline); pipeline.stats() holds the per-stage queue depths and utilization.
+    """
+    telemetry = telemetry or Telemetry()
+    unknown_stages = set(stage_workers or {}) - set(DEFAULT_STAGE_WORKERS)
+    if unknown_stages:
+        raise ValueError(f"Unknown pipeline stage(s) {', '.join(sorted(unknown_stages))}, expected {', '.join(DEFAULT_STAGE_WORKERS)}.")
+    stage_workers = dict(DEFAULT_STAGE_WORKERS, **(stage_workers or {}))
+    format_executor = ThreadPoolExecutor(max_workers=stage_workers["format"])
+
+    def read(filename):
+        base_filename = os.path.splitext(filename)[0]
+        job = {
+            "filename": filename,
+            "base_filename": base_filename,
+            "input_file": os.path.join(input_dir, filename),
+            "step1_output_file": os.path.join(output_dir, f'{base_filename}_step1.txt'),
+            "step2_output_file": os.path.join(output_dir, f'{base_filename}_step2.json'),
+            "comparison_results_file": os.path.join(output_dir, f'{base_filename}_comparison_results.json'),
+            "plan": "full",
+            "keys": (None, None),
+            "separated_addresses": [],
+            "formatted_addresses": [],
+            "pending": 1,  # Chunks still to be formatted, plus the end-of-file marker
+            "lock": threading.Lock(),
+            "result": None
+        }
+        if manifest is not None:
+            job["keys"] = manifest.keys(job["input_file"])
+            job["plan"] = manifest.plan(filename, *job["keys"], job["step2_output_file"], job["comparison_results_file"])
+        if job["plan"] == "reuse":
+            print(f"Unchanged, reusing stored results: {filename}")
+            job["result"] = record_result(results_sink, manifest.result(filename), data_handler.read_json(job["comparison_results_file"]))
+            return [job]
+
+        print(f"Processing file: {filename}")
+        with telemetry.stage("read", filename):
+            if job["plan"] == "compare":
+                job["formatted_addresses"] = data_handler.read_json(job["step2_output_file"]) or []
+            else:
+                job["input_addresses"] = data_handler.read_csv(job["input_file"])
+                if not job["input_addresses"]:
+                    print(f"Error: No addresses found in {filename}. Skipping file.")
+                    job["result"] = {"filename": filename, "status": "FAILED", "reason": "No addresses found"}
+        return [job]
+
+    def separate(job):
+        if job["result"] is not None or job["plan"] == "compare":
+            # Nothing to separate or format: straight on to the comparison
+            yield job
+            return
+        input_addresses = job.pop("input_addresses")
+        with telemetry.stage("separate", job["filename"]):
+            if stream:
+                chunks = processor.separate_addresses_stream(input_addresses, version="v1")
+            else:
+                chunks = [processor.separate_addresses(input_addresses, version="v1")]
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                job["separated_addresses"].extend(chunk)
+                with job["lock"]:
+                    job["pending"] += 1
+                yield {"job": job, "chunk": chunk}
+        if not job["separated_addresses"]:
+            print(f"Error: Failed to separate addresses in {job['filename']}.")
+            job["result"] = {"filename": job["filename"], "status": "FAILED", "reason": "Address separation error"}
+        # Whichever of this marker and the file's last chunk is formatted last releases the file
+        yield {"job": job, "chunk": None}
+
+    def format_chunk(item):
+        if "chunk" not in item:
+            return [item]
+        job = item["job"]
+        if item["chunk"]:
+            with telemetry.stage("format", job["filename"]):
+                formatted_addresses = processor.format_addresses(item["chunk"], version="v1", batch_size=batch_size,
+                                                                 executor=format_executor)
+            with job["lock"]:
+                job["formatted_addresses"].extend(formatted_addresses)
+        with job["lock"]:
+            job["pending"] -= 1
+            complete = job["pending"] == 0
+        return [job] if complete else []
+
+    def compare(job):
+        if job["result"] is None and not job["formatted_addresses"]:
+            print(f"Error: Failed to format addresses in {job['filename']}.")
+            job["result"] = {"filename": job["filename"], "status": "FAILED", "reason": "Address formatting error"}
+        if job["result"] is None:
+            job["comparison_stats"] = {}
+            with telemetry.stage("compare", job["filename"]):
+                job["comparison_report"] = compare_with_profiling(comparator, job["formatted_addresses"], ground_truth,
+                                                                  job["comparison_stats"], telemetry, job["base_filename"])
+        return [job]
+
+    def write(job):
+        filename = job["filename"]
+        if job["result"] is None:
+            with telemetry.stage("write", filename):
+                if job["plan"] == "full":
+                    data_handler.save_txt(job["step1_output_file"], job["separated_addresses"])
+                    data_handler.save_json(job["step2_output_file"], job["formatted_addresses"])
+                data_handler.save_json(job["comparison_results_file"], job["comparison_report"])
+            job["result"] = comparison_result(filename, job["comparison_report"], job["comparison_stats"])
+            if manifest is not None:
+                manifest.record(filename, *job["keys"], job["result"])
+            record_result(results_sink, job["result"], job["comparison_report"])
+        return [job["result"]]
+
+    functions = {"read": read, "separate": separate, "format": format_chunk, "compare": compare, "write": write}
+    pipeline = StagedPipeline(
+        [Stage(name, functions[name], workers=stage_workers[name], queue_size=queue_size) for name in DEFAULT_STAGE_WORKERS],
+        readout_interval=readout_interval
+    )
+    try:
+        results = pipeline.run(all_files)
+    finally:
+        format_executor.shutdown()
+
+    # A file lost to an unexpected error in a stage still gets a result
+    finished = {result["filename"] for result in results}
+    results.extend({"filename": filename, "status": "FAILED", "reason": "Pipeline error"}
+                   for filename in all_files if filename not in finished)
+    return results, pipeline
+
+def main(brute_force=False, bulk=False, assignment="greedy", cache_mode="readwrite", cache_path='.cache/responses.sqlite', batch_size=None,
+         use_async=False, max_concurrency=16, requests_per_minute=500, tokens_per_minute=200000, stream=False,
+         local_parse=False, local_min_confidence=0.8, profile_comparator=None, backend="openai", replay_latency=0.0,
+         replay_error_rate=0.0, incremental=False, manifest_path='output_data/manifest.json', compare_processes=None,
+         ground_truth_file='ground_truth.json', pipelined=False, stage_workers=None, queue_size=16, readout_interval=None,
+         results_formats=("jsonl",), dedup=False, base_url=None):
     # Initialize components
-    processor = OpenAIProcessor()
+    telemetry = Telemetry(profiler=profile_comparator)
+    cache = ResponseCache(cache_path, mode=cache_mode)
+    local_parser = LocalAddressParser(min_confidence=local_min_confidence) if local_parse else None
+    deduplicator = RequestDeduplicator() if dedup else None
+    # Offline runs replay the recorded outputs instead of calling the API
+    llm_backend = None
+    if backend == "replay":
+        llm_backend = ReplayBackend(latency=LatencyModel("lognormal", replay_latency), error_rate=replay_error_rate)
+    scheduler = None
+    if use_async:
+        scheduler = RequestScheduler(max_concurrency=max_concurrency, requests_per_minute=requests_per_minute,
+                                     tokens_per_minute=tokens_per_minute, telemetry=telemetry)
+        processor = AsyncOpenAIProcessor(scheduler=scheduler, cache=cache, local_parser=local_parser, telemetry=telemetry,
+                                         backend=llm_backend, deduplicator=deduplicator, base_url=base_url)
+    else:
+        processor = OpenAIProcessor(cache=cache, local_parser=local_parser, telemetry=telemetry, backend=llm_backend,
+                                    deduplicator=deduplicator, base_url=base_url)
     data_handler = DataHandler()
-    comparator = AddressComparator()
+    comparator = AddressComparator(brute_force=brute_force, bulk=bulk, assignment=assignment, processes=compare_processes)
 
     # Directory for input files
     input_dir = 'input_data/'
-    ground_truth_file = 'ground_truth.json'
 
     # Get the current time for the report file name
     now = datetime.datetime.now()
@@ -77,11 +405,19 @@ def main():
 
     # Step 1: Load the ground truth once
     print("Loading ground truth data...")
-    ground_truth = data_handler.read_json(ground_truth_file)
+    ground_truth = data_handler.read_ground_truth(ground_truth_file)
     if not ground_truth:
         print(f"Error: Ground truth file {ground_truth_file} is missing or invalid.")
         return
 
+    # Build the comparator index (or bulk scorer) once so every file reuses it
+    if bulk:
+        comparator.build_bulk_scorer(ground_truth)
+    elif compare_processes:
+        comparator.build_parallel_scorer(ground_truth)
+    elif not brute_force:
+        comparator.build_index(ground_truth)
+
     # Step 2: Get the prompts used
     separate_prompt = processor.get_prompt('separate_addresses', version="v1")
     format_prompt = processor.get_prompt('format_addresses', version="v1")
@@ -95,17 +431,76 @@ def main():
     report_header.append("="*80)
     report_header.append("")
 
-    # Step 4: Process each file in parallel using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=5) as executor:  # Adjust `max_workers` as needed
-        futures = {executor.submit(process_single_file, filename, processor, data_handler, comparator, ground_truth): filename for filename in all_files}
-        for future in as_completed(futures):
-            result = future.result()
-            if result['status'] == "PASS":
-                total_passes += 1
-                detailed_report.append(f"{result['filename']}: PASS")
-            else:
-                total_failures += 1
-                detailed_report.append(f"{result['filename']}: FAILED - {result['reason']}")
+    # With incremental runs, work whose inputs are unchanged since the last run is skipped
+    manifest = None
+    if incremental:
+        source_dir = os.path.dirname(os.path.abspath(__file__))
+        llm_fingerprint = {
+            "model": processor.model,
+            "backend": backend,
+            "base_url": base_url,
+            "prompts": {"separate_addresses": ["v1", separate_prompt], "format_addresses": ["v1", format_prompt]},
+            "batch_size": batch_size,
+            "stream": stream,
+            "local_min_confidence": local_min_confidence if local_parse else None,
+            "dedup": dedup
+        }
+        compare_fingerprint = {
+            "ground_truth": hash_file(ground_truth_file),
+            "comparator_source": [hash_file(os.path.join(source_dir, module))
+                                  for module in ("address_comparator.py", "bulk_comparator.py", "parallel_comparator.py")],
+            "options": {"brute_force": brute_force, "bulk": bulk, "assignment": assignment}
+        }
+        manifest = RunManifest(manifest_path, llm_fingerprint, compare_fingerprint)
+
+    # One dataset for the whole run, appended to as each file finishes
+    results_sink = ResultsSink(now.strftime('output_data/results_%Y-%m-%d_%H-%M-%S'), formats=results_formats)
+
+    # Step 4: Process each file in parallel, either on one event loop with a shared scheduler or using ThreadPoolExecutor
+    pipeline = None
+    if pipelined:
+        results, pipeline = process_files_pipelined(all_files, processor, data_handler, comparator, ground_truth, batch_size, stream,
+                                                    telemetry, stage_workers, queue_size, readout_interval, input_dir,
+                                                    'output_data/', manifest, results_sink)
+    elif use_async:
+        results = asyncio.run(process_files_async(all_files, processor, data_handler, comparator, ground_truth, batch_size, telemetry,
+                                                  input_dir, 'output_data/', manifest, results_sink))
+    else:
+        results = []
+        with ThreadPoolExecutor(max_workers=5) as executor:  # Adjust `max_workers` as needed
+            futures = {executor.submit(process_single_file, filename, processor, data_handler, comparator, ground_truth, batch_size, stream, telemetry,
+                                       input_dir, 'output_data/', manifest, results_sink): filename for filename in all_files}
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    comparator.close()
+    if manifest is not None:
+        manifest.save()
+    # Files that failed before their comparison have no rows yet
+    for result in results:
+        if result["filename"] not in results_sink.filenames:
+            results_sink.add(result)
+    results_paths = results_sink.close()
+
+    for result in results:
+        reused = " (unchanged, stored result)" if result.get("reused") else ""
+        if result['status'] == "PASS":
+            total_passes += 1
+            detailed_report.append(f"{result['filename']}: PASS{reused}")
+        else:
+            total_failures += 1
+            detailed_report.append(f"{result['filename']}: FAILED - {result['reason']}{reused}")
+
+        # With optimal assignment, list the matches that differ from what greedy mode would have picked
+        assignment_changes = result.get("comparison_stats", {}).get("assignment_changes")
+        if assignment_changes:
+            detailed_report.append(f"    {len(assignment_changes)} matches changed compared to greedy assignment:")
+            for change in assignment_changes:
+                processed = change["processed_address"]
+                detailed_report.append(
+                    f"    {processed.get('FirstName', '')} {processed.get('LastName', '')}, {processed.get('Postcode', '')}: "
+                    f"greedy -> {change['greedy_truth_index']}, optimal -> {change['optimal_truth_index']}"
+                )
 
     # Step 5: Write the detailed report
     report_footer = [
@@ -113,9 +508,99 @@ def main():
         f"Total files tested: {total_files}",
         f"Total passes: {total_passes}",
         f"Total failures: {total_failures}",
-        "="*80
     ]
 
+    cache_stats = cache.stats()
+    report_footer.append(
+        f"Response cache ({cache_stats['mode']}): {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['writes']} writes, {cache_stats['evictions']} evictions, hit rate {cache_stats['hit_rate']:.1%}"
+    )
+
+    if batch_size:
+        batch_summary = processor.batch_summary()
+        report_footer.append(
+            f"Batched formatting: {batch_summary['addresses']} addresses in {batch_summary['batches']} requests, "
+            f"{batch_summary['prompt_tokens']} prompt / {batch_summary['completion_tokens']} completion tokens "
+            f"(~{batch_summary['estimated_unbatched_prompt_tokens']} prompt tokens unbatched), "
+            f"{batch_summary['fallbacks']} single-address fallbacks"
+        )
+
+    if local_parser is not None:
+        local_stats = local_parser.stats()
+        report_footer.append(
+            f"Local parser (min confidence {local_min_confidence}): {local_stats['bypassed']} of {local_stats['parsed']} "
+            f"addresses bypassed the model, bypass rate {local_stats['bypass_rate']:.1%}"
+        )
+
+    # Comparator hot loop, over the files compared in this run
+    compared_stats = [result.get("comparison_stats", {}) for result in results if not result.get("reused")]
+    compared = sum(stats.get("processed", 0) for stats in compared_stats)
+    if compared:
+        exact_matches = sum(stats.get("exact_matches", 0) for stats in compared_stats)
+        field_comparisons = sum(stats.get("field_comparisons", 0) for stats in compared_stats)
+        field_scores_reused = sum(stats.get("field_scores_reused", 0) for stats in compared_stats)
+        report_footer.append(
+            f"Exact-match short-circuit: {exact_matches} of {compared} processed addresses ({exact_matches / compared:.1%}), "
+            f"field scores reused for {field_scores_reused} of {field_comparisons} matched pairs"
+        )
+
+    if deduplicator is not None:
+        dedup_stats = deduplicator.stats()
+        report_footer.append(
+            f"Request dedup: {dedup_stats['addresses']} separated addresses, {dedup_stats['sent']} sent to the model, "
+            f"dedup ratio {dedup_stats['dedup_ratio']:.1f}x"
+        )
+
+    if manifest is not None:
+        manifest_stats = manifest.stats()
+        report_footer.append(
+            f"Incremental run: {manifest_stats['reuse']} files reused, {manifest_stats['compare']} re-compared only, "
+            f"{manifest_stats['full']} fully processed"
+        )
+
+    report_footer.append(f"Run dataset: {results_sink.rows} rows in {', '.join(results_paths)}")
+
+    if pipeline is not None:
+        report_footer.append(f"Pipeline ({pipeline.wall_time_s:.1f}s, bottleneck: {pipeline.bottleneck()}):")
+        for stage, stats in pipeline.stats().items():
+            report_footer.append(
+                f"    {stage}: {stats['workers']} workers, {stats['processed']} items, {stats['utilization']:.0%} busy, "
+                f"queue depth mean {stats['queue_depth_mean']:.1f} / max {stats['queue_depth_max']} of {stats['queue_size']}"
+            )
+
+    if llm_backend is not None:
+        replay_line = f"Replay backend: {llm_backend.calls} calls, {llm_backend.misses} answers not in the recordings"
+        if llm_backend.misses:
+            replay_line += " (rows echoed / parsed locally instead), so results differ from the recorded run"
+        report_footer.append(replay_line)
+
+    if scheduler is not None:
+        scheduler_stats = scheduler.stats()
+        report_footer.append(
+            f"Scheduler (max {scheduler_stats['max_concurrency']} in flight): {scheduler_stats['requests']} requests, "
+            f"{scheduler_stats['retries']} retries, {scheduler_stats['rate_limited']} rate limited"
+        )
+
+    # Machine-readable timings next to the text report
+    telemetry_summary = telemetry.write(os.path.splitext(report_file)[0] + "_telemetry")
+    totals = telemetry_summary["totals"]
+    report_footer.append(
+        f"Telemetry: {telemetry_summary['wall_time_s']:.1f}s wall time, {totals['requests']} model calls "
+        f"({totals['cached']} more served from the response cache), "
+        f"{totals['prompt_tokens']} prompt / {totals['completion_tokens']} completion tokens, "
+        f"{totals['retries']} retries, estimated cost ${totals['cost_usd']:.4f}"
+    )
+    for stage, stats in telemetry_summary["stages"].items():
+        report_footer.append(f"    {stage}: {stats['total_s']:.2f}s total, p50 {stats['p50_s']:.3f}s, p95 {stats['p95_s']:.3f}s")
+    for prompt_type, stats in telemetry_summary["calls"].items():
+        report_footer.append(
+            f"    {prompt_type} calls: p50 {stats['p50_s']:.3f}s, p95 {stats['p95_s']:.3f}s, p99 {stats['p99_s']:.3f}s, "
+            f"queue wait p50 {stats['queue_wait']['p50_s']:.3f}s, p95 {stats['queue_wait']['p95_s']:.3f}s"
+        )
+
+    report_footer.append("="*80)
+    cache.close()
+
     with open(report_file, 'w') as report:
         report.write("\n".join(report_header))
         report.write("\n".join(detailed_report))
@@ -124,4 +609,78 @@ def main():
     print(f"Test report saved to {report_file}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the address checker over all files in input_data/.")
+    parser.add_argument("--brute-force", action="store_true",
+                        help="Score every ground truth record instead of using the comparator index (for verification).")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Score addresses with the vectorized rapidfuzz/numpy engine (needs rapidfuzz and numpy).")
+    parser.add_argument("--assignment", choices=AddressComparator.ASSIGNMENTS, default="greedy",
+                        help="How processed addresses are paired with ground truth records (optimal needs scipy).")
+    parser.add_argument("--cache-mode", choices=ResponseCache.MODES, default="readwrite",
+                        help="How model responses are cached on disk between runs.")
+    parser.add_argument("--cache-path", default='.cache/responses.sqlite',
+                        help="Location of the response cache database.")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Format up to this many addresses per request instead of one request per address.")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Use the asyncio processor with one rate-limited scheduler shared by all files.")
+    parser.add_argument("--max-concurrency", type=int, default=16,
+                        help="Maximum number of model requests in flight across all files (--async only).")
+    parser.add_argument("--rpm", type=int, default=500, help="Requests per minute limit (--async only).")
+    parser.add_argument("--tpm", type=int, default=200000, help="Tokens per minute limit (--async only).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Separate large files in token-bounded chunks and format each chunk as soon as it is separated (not with --async).")
+    parser.add_argument("--local-parse", action="store_true",
+                        help="Parse well-formed addresses locally and only send low-confidence ones to the model.")
+    parser.add_argument("--local-min-confidence", type=float, default=0.8,
+                        help="Confidence needed for a locally parsed address to skip the model.")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Format each distinct address once per run: copies that differ only in case, whitespace, "
+                             "punctuation, bullets, delimiters or postcode spacing share one model request and its result.")
+    parser.add_argument("--profile-comparator", choices=Telemetry.PROFILERS, default=None,
+                        help="Profile each file's comparison and save the profiles in output_data/profiles/.")
+    parser.add_argument("--backend", choices=["openai", "replay"], default="openai",
+                        help="Where completions come from: the OpenAI API, or a replay of the outputs in output_data/ (offline).")
+    parser.add_argument("--base-url", default=None,
+                        help="OpenAI API base URL, e.g. http://127.0.0.1:8089/v1 for fake_openai_server.py (--backend openai only).")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="Median simulated latency per call in seconds (--backend replay only).")
+    parser.add_argument("--replay-error-rate", type=float, default=0.0,
+                        help="Fraction of calls that fail with a simulated rate limit error (--backend replay only).")
+    parser.add_argument("--ground-truth", default='ground_truth.json',
+                        help="Ground truth JSON file, or a store compiled with ground_truth_store.py (.gtstore).")
+    parser.add_argument("--compare-processes", type=int, default=None,
+                        help="Score comparisons on this many worker processes, each mapping one ground truth store.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run files through a staged pipeline (read, separate, format, compare, write) with bounded queues; "
+                             "combine with --stream to format chunks while the rest of a file is being separated (not with --async).")
+    parser.add_argument("--stage-workers", nargs="+", default=[], metavar="STAGE=N",
+                        help=f"Worker threads per pipeline stage, e.g. format=16 (defaults: "
+                             f"{', '.join(f'{stage}={workers}' for stage, workers in DEFAULT_STAGE_WORKERS.items())}).")
+    parser.add_argument("--queue-size", type=int, default=16, help="Capacity of each pipeline stage's input queue.")
+    parser.add_argument("--queue-readout", type=float, default=None, metavar="SECONDS",
+                        help="Print the pipeline queue depths every SECONDS seconds.")
+    parser.add_argument("--results-formats", nargs="+", choices=ResultsSink.FORMATS, default=["jsonl"],
+                        help="Formats of the consolidated run dataset (output_data/results_*); JSON Lines is always written "
+                             "as files finish, csv and parquet (needs pyarrow) are derived from it at the end.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip files whose input, prompts, model and settings are unchanged since the last run; "
+                             "re-run only the comparison if just the comparator or ground truth changed.")
+    parser.add_argument("--manifest-path", default='output_data/manifest.json',
+                        help="Where the incremental run manifest is kept.")
+    args = parser.parse_args()
+    # The pipeline stages and streamed separation drive the synchronous processor
+    if args.use_async and args.pipeline:
+        parser.error("--pipeline cannot be combined with --async")
+    if args.use_async and args.stream:
+        parser.error("--stream cannot be combined with --async")
+    main(brute_force=args.brute_force, bulk=args.bulk, assignment=args.assignment, cache_mode=args.cache_mode, cache_path=args.cache_path, batch_size=args.batch_size,
+         use_async=args.use_async, max_concurrency=args.max_concurrency, requests_per_minute=args.rpm,
+         tokens_per_minute=args.tpm, stream=args.stream,
+         local_parse=args.local_parse, local_min_confidence=args.local_min_confidence,
+         profile_comparator=args.profile_comparator, backend=args.backend, replay_latency=args.replay_latency,
+         replay_error_rate=args.replay_error_rate, incremental=args.incremental, manifest_path=args.manifest_path,
+         compare_processes=args.compare_processes, ground_truth_file=args.ground_truth, pipelined=args.pipeline,
+         stage_workers={stage: int(workers) for stage, workers in (item.split("=", 1) for item in args.stage_workers)},
+         queue_size=args.queue_size, readout_interval=args.queue_readout, results_formats=args.results_formats,
+         dedup=args.dedup, base_url=args.base_url)
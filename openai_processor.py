@@ -1,14 +1,72 @@
 import os
 import json
+import time
 from openai import OpenAI
+from itertools import repeat
+from contextlib import nullcontext
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from address_chunker import chunk_rows, dedupe_chunk_edges
+from llm_backends import OpenAIBackend
+
+# Structured output schema for a single formatted address (Step 2)
+ADDRESS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "FirstName": {"type": "string", "description": "First name of the recipient."},
+        "LastName": {"type": "string", "description": "Last name of the recipient."},
+        "StreetName": {"type": "string", "description": "Name of the street and house number."},
+        "Town": {"type": "string", "description": "Name of the town or city."},
+        "Postcode": {"type": "string", "description": "The postal code."},
+        "Country": {"type": "string", "description": "Country code, e.g., 'GB'."}
+    },
+    "required": ["FirstName", "LastName", "StreetName", "Town", "Postcode", "Country"],
+    "additionalProperties": False
+}
+
+# Structured output schema for a batch of formatted addresses, one item per input address
+BATCH_ADDRESS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "addresses": {"type": "array", "items": ADDRESS_SCHEMA}
+    },
+    "required": ["addresses"],
+    "additionalProperties": False
+}
+
+# Appended to the format prompt when several addresses are sent in one request
+BATCH_INSTRUCTIONS = (
+    "You will be given {count} numbered addresses, one per line. Return an object whose 'addresses' array "
+    "contains exactly {count} entries, one for each input address, in the same order as the input."
+)
+
+# Rough completion size of one formatted address, used to keep batches under max_tokens
+TOKENS_PER_FORMATTED_ADDRESS = 60
 
 class OpenAIProcessor:
-    def __init__(self):
-        # Initialize the OpenAI client instance with API key from environment
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, client=None, cache=None, local_parser=None, telemetry=None, backend=None, deduplicator=None, base_url=None):
+        """
+        client: An OpenAI-compatible client. Defaults to a real OpenAI client; pass a stub to run offline.
+        backend: An LLMBackend answering the completions, e.g. a ReplayBackend for offline runs and
+        benchmarks. Defaults to an OpenAIBackend around client.
+        cache: An optional ResponseCache used for every model call.
+        local_parser: An optional LocalAddressParser; addresses it parses confidently skip the model.
+        telemetry: An optional Telemetry that records latency, token usage and cost of every call.
+        deduplicator: An optional RequestDeduplicator; copies of an address written differently are formatted once.
+        base_url: API base URL for the default client, e.g. a local fake server for load tests.
+        """
+        if backend is None:
+            # Initialize the OpenAI client instance with API key from environment
+            backend = OpenAIBackend(client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url))
+        self.backend = backend
+        self.base_url = base_url
         self.model = "gpt-4o-mini"
+        self.temperature = None  # Overrides the temperature of every request when set
         self.prompts = self.load_prompts('prompts/prompts.json')
+        self.cache = cache
+        self.local_parser = local_parser
+        self.telemetry = telemetry
+        self.deduplicator = deduplicator
+        self.batch_stats = []  # One entry per batched format request
 
     def load_prompts(self, file_path):
         """Load the prompts from a JSON file."""
@@ -30,6 +88,123 @@ class OpenAIProcessor:
             print(f"Error: Prompt version '{version}' for '{prompt_type}' not found.")
             return ""
 
+    def create_completion(self, prompt_type, version, prompt, user_content, validate=None, **params):
+        """
+        Send one chat completion and return the message content.
+        Goes through the response cache when one is configured; params (sampling and
+        response_format) are part of the cache key. validate(content) tells whether a response is
+        usable: only usable responses are cached, and cached ones that are not are never served.
+        """
+        content, _ = self.create_completion_with_usage(prompt_type, version, prompt, user_content, validate, **params)
+        return content
+
+    def create_completion_with_usage(self, prompt_type, version, prompt, user_content, validate=None, **params):
+        """
+        Same as create_completion, but returns (content, usage) where usage holds the prompt and
+        completion token counts reported by the API, or None when the response came from the cache.
+        """
+        start = time.perf_counter()
+        params = self.sampling_params(params)
+        cache_key = self.cache_key(prompt_type, version, prompt, user_content, params)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None and self.is_cacheable(cached, validate):
+                self.record_call(prompt_type, start, cached=True)
+                return cached, None
+
+        try:
+            content, usage = self.backend.complete(self.model, self.build_messages(prompt, user_content), **params)
+        except Exception as e:
+            self.record_call(prompt_type, start, error=type(e).__name__)
+            raise
+        self.record_call(prompt_type, start, usage=usage)
+
+        if cache_key is not None and self.is_cacheable(content, validate):
+            self.cache.put(cache_key, content)
+        return content, usage
+
+    def is_cacheable(self, content, validate=None):
+        """Whether a response may be stored in (or served from) the cache."""
+        return content is not None and (validate is None or validate(content))
+
+    def parse_json(self, content):
+        """Parsed JSON response content, None if it is not valid JSON (e.g. a truncated reply)."""
+        try:
+            return json.loads(content)
+        except (TypeError, ValueError):
+            return None
+
+    def is_address_response(self, content):
+        """Whether a single-address response is a complete address record."""
+        return self.is_valid_address(self.parse_json(content))
+
+    def is_batch_response(self, content, count):
+        """Whether a batch response holds one complete address record for each of count addresses."""
+        parsed = self.parse_json(content)
+        items = parsed.get("addresses") if isinstance(parsed, dict) else None
+        return isinstance(items, list) and len(items) == count and all(self.is_valid_address(item) for item in items)
+
+    def is_separation_response(self, content):
+        """Whether a separation response holds at least one address."""
+        return bool(self.clean_text_response(content))
+
+    def sampling_params(self, params):
+        """Request params with the processor-wide temperature override applied, if one is set."""
+        if self.temperature is None:
+            return params
+        return dict(params, temperature=self.temperature)
+
+    def record_call(self, prompt_type, start, usage=None, cached=False, error=None, latency=None):
+        """
+        Report a finished call, started at time.perf_counter() value start, to the telemetry if any.
+        latency is the time of the API call itself when it is known; the rest since start is queue wait.
+        """
+        if self.telemetry is not None:
+            elapsed = time.perf_counter() - start
+            latency = elapsed if latency is None else latency
+            self.telemetry.record_call(prompt_type, self.model, latency, usage=usage, cached=cached, error=error,
+                                       queue_wait=max(0.0, elapsed - latency))
+
+    def cache_key(self, prompt_type, version, prompt, user_content, params):
+        """Cache key for a request, or None when no cache is configured."""
+        if self.cache is None:
+            return None
+        return self.cache.make_key(
+            backend=self.backend.name,
+            base_url=self.base_url,
+            model=self.model,
+            prompt_type=prompt_type,
+            version=version,
+            prompt=prompt,
+            content=user_content,
+            params=params
+        )
+
+    def build_messages(self, prompt, user_content):
+        """Chat messages for a system prompt and the user content."""
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": user_content}
+        ]
+
+    def address_params(self):
+        """Request parameters for formatting a single address with structured output."""
+        return {
+            "temperature": 1,
+            "max_tokens": 4095,
+            "top_p": 1,
+            "frequency_penalty": 0,
+            "presence_penalty": 0,
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "address_schema",
+                    "strict": True,
+                    "schema": ADDRESS_SCHEMA
+                }
+            }
+        }
+
     def process_single_address(self, address, prompt_type, version):
         """
         Process a single address with OpenAI.
@@ -39,50 +214,26 @@ class OpenAIProcessor:
             return {}
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": address}
-                ],
-                temperature=1,
-                max_tokens=4095,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0,
-                response_format={
-                    "type": "json_schema",
-                    "json_schema": {
-                        "name": "address_schema",
-                        "strict": True,
-                        "schema": {
-                            "type": "object",
-                            "properties": {
-                                "FirstName": {"type": "string", "description": "First name of the recipient."},
-                                "LastName": {"type": "string", "description": "Last name of the recipient."},
-                                "StreetName": {"type": "string", "description": "Name of the street and house number."},
-                                "Town": {"type": "string", "description": "Name of the town or city."},
-                                "Postcode": {"type": "string", "description": "The postal code."},
-                                "Country": {"type": "string", "description": "Country code, e.g., 'GB'."}
-                            },
-                            "required": ["FirstName", "LastName", "StreetName", "Town", "Postcode", "Country"],
-                            "additionalProperties": False
-                        }
-                    }
-                }
-            )
-            response_content = response.choices[0].message.content
+            response_content = self.create_completion(prompt_type, version, prompt, address, self.is_address_response,
+                                                      **self.address_params())
             return json.loads(response_content)  # Convert from JSON string to Python dictionary
         except Exception as e:
             print(f"Error processing address with OpenAI: {str(e)}")
             return {}
 
-    def process_addresses_parallel(self, addresses, prompt_type, version):
+    def call_executor(self, executor=None):
+        """
+        Context manager giving the executor model calls run on: executor when given (a shared, bounded
+        pool the caller owns and shuts down), otherwise a pool of its own for this call.
+        """
+        return nullcontext(executor) if executor is not None else ThreadPoolExecutor()
+
+    def process_addresses_parallel(self, addresses, prompt_type, version, executor=None):
         """
         Process multiple addresses in parallel using the OpenAI API.
         """
         results = []
-        with ThreadPoolExecutor() as executor:
+        with self.call_executor(executor) as executor:
             futures = {executor.submit(self.process_single_address, address, prompt_type, version): address for address in addresses}
             for future in as_completed(futures):
                 try:
@@ -93,6 +244,157 @@ class OpenAIProcessor:
                     print(f"Error in parallel processing: {str(e)}")
         return results
 
+    def estimate_tokens(self, text):
+        """Cheap token estimate (about four characters per token) used for batch planning."""
+        return len(text) // 4 + 1
+
+    def plan_batches(self, addresses, max_batch_size, token_budget):
+        """
+        Split addresses into batches of at most max_batch_size whose estimated completion
+        (TOKENS_PER_FORMATTED_ADDRESS per address plus the echoed input) stays under token_budget.
+        Returns lists of input positions so results can be put back in order.
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for position, address in enumerate(addresses):
+            address_tokens = TOKENS_PER_FORMATTED_ADDRESS + self.estimate_tokens(address)
+            if current and (len(current) >= max_batch_size or current_tokens + address_tokens > token_budget):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(position)
+            current_tokens += address_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def is_valid_address(self, item):
+        """Check that a structured output item has every address field as a string."""
+        return isinstance(item, dict) and all(isinstance(item.get(field), str) for field in ADDRESS_SCHEMA["required"])
+
+    def batch_request(self, addresses, prompt, max_tokens=4095):
+        """
+        Build the request for formatting several addresses at once.
+        Returns (batch_prompt, user_content, params, stats); stats is registered in batch_stats.
+        """
+        batch_prompt = f"{prompt}\n\n{BATCH_INSTRUCTIONS.format(count=len(addresses))}"
+        numbered_addresses = "\n".join(f"{number}. {address}" for number, address in enumerate(addresses, start=1))
+        params = {
+            "temperature": 1,
+            "max_tokens": max_tokens,
+            "top_p": 1,
+            "frequency_penalty": 0,
+            "presence_penalty": 0,
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "address_batch_schema",
+                    "strict": True,
+                    "schema": BATCH_ADDRESS_SCHEMA
+                }
+            }
+        }
+        stats = {
+            "size": len(addresses),
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            # What the same addresses would have cost in prompt tokens as separate requests
+            "estimated_unbatched_prompt_tokens": sum(
+                self.estimate_tokens(prompt) + self.estimate_tokens(json.dumps(ADDRESS_SCHEMA)) + self.estimate_tokens(address)
+                for address in addresses
+            ),
+            "fallbacks": 0
+        }
+        self.batch_stats.append(stats)
+        return batch_prompt, numbered_addresses, params, stats
+
+    def batch_results(self, addresses, items, stats):
+        """Map the items of a batch response back to its addresses, None where an item is missing or invalid."""
+        if len(items) != len(addresses):
+            # Without a one-to-one answer we cannot tell which item belongs to which address
+            if items:
+                print(f"Warning: Batch of {len(addresses)} addresses returned {len(items)} items, falling back to single requests.")
+            results = [None] * len(addresses)
+        else:
+            results = [item if self.is_valid_address(item) else None for item in items]
+        stats["fallbacks"] = results.count(None)
+        return results
+
+    def process_address_batch(self, addresses, prompt_type, version, max_tokens=4095):
+        """
+        Format several addresses with a single request.
+        Returns one result per input address, None for entries that came back missing or invalid.
+        """
+        prompt = self.get_prompt(prompt_type, version)
+        if not prompt:
+            return [None] * len(addresses)
+
+        batch_prompt, numbered_addresses, params, stats = self.batch_request(addresses, prompt, max_tokens)
+        try:
+            response_content, usage = self.create_completion_with_usage(
+                prompt_type, version, batch_prompt, numbered_addresses,
+                lambda content: self.is_batch_response(content, len(addresses)), **params)
+            if usage:
+                stats.update(usage)
+            items = json.loads(response_content).get("addresses", [])
+        except Exception as e:
+            print(f"Error processing address batch with OpenAI: {str(e)}")
+            items = []
+        return self.batch_results(addresses, items, stats)
+
+    def process_addresses_batched(self, addresses, prompt_type, version, max_batch_size=20, token_budget=3000, executor=None):
+        """
+        Process addresses in batches of up to max_batch_size per request, keeping each batch's
+        estimated completion under token_budget. Entries a batch fails to return are retried
+        with single-address requests. Results are returned in input order.
+        """
+        results = self.batched_results(addresses, prompt_type, version, max_batch_size, token_budget, executor)
+        return [result for result in results if result]
+
+    def batched_results(self, addresses, prompt_type, version, max_batch_size=20, token_budget=3000, executor=None):
+        """process_addresses_batched, with one entry per address (empty or None where it failed)."""
+        results = [None] * len(addresses)
+        batches = self.plan_batches(addresses, max_batch_size, token_budget)
+
+        with self.call_executor(executor) as executor:
+            futures = {
+                executor.submit(self.process_address_batch, [addresses[position] for position in batch], prompt_type, version): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    for position, result in zip(batch, future.result()):
+                        results[position] = result
+                except Exception as e:
+                    print(f"Error in batch processing: {str(e)}")
+
+            # Fall back to one request per address for anything the batches did not return
+            fallback_futures = {
+                executor.submit(self.process_single_address, addresses[position], prompt_type, version): position
+                for position, result in enumerate(results) if result is None
+            }
+            for future in as_completed(fallback_futures):
+                try:
+                    results[fallback_futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Error in parallel processing: {str(e)}")
+
+        return results
+
+    def batch_summary(self):
+        """Totals over all batched requests so far, for the test report."""
+        summary = {
+            "batches": len(self.batch_stats),
+            "addresses": sum(stats["size"] for stats in self.batch_stats),
+            "prompt_tokens": sum(stats["prompt_tokens"] or 0 for stats in self.batch_stats),
+            "completion_tokens": sum(stats["completion_tokens"] or 0 for stats in self.batch_stats),
+            "estimated_unbatched_prompt_tokens": sum(stats["estimated_unbatched_prompt_tokens"] for stats in self.batch_stats),
+            "fallbacks": sum(stats["fallbacks"] for stats in self.batch_stats)
+        }
+        return summary
+
     def separate_addresses(self, addresses, version="v1"):
         """Process addresses for separation (Step 1, expect plain text)."""
         # Adjust to use a single API call since this is for separating addresses
@@ -104,23 +406,65 @@ class OpenAIProcessor:
         address_content = "\n".join(addresses)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": address_content}
-                ],
+            response_content = self.create_completion(
+                'separate_addresses', version, prompt, address_content, self.is_separation_response,
                 max_tokens=4000,
                 temperature=0.7
             )
-            return self.clean_text_response(response.choices[0].message.content)
+            return self.clean_text_response(response_content)
         except Exception as e:
             print(f"Error processing addresses with OpenAI: {str(e)}")
             return []
 
-    def format_addresses(self, separated_addresses, version="v1"):
-        """Process separated addresses for formatting (Step 2, expect structured output)."""
-        return self.process_addresses_parallel(separated_addresses, 'format_addresses', version)
+    def separate_addresses_stream(self, rows, version="v1", max_chunk_tokens=1500, overlap_rows=2):
+        """
+        Streaming variant of separate_addresses for large files.
+        Rows (any iterable, e.g. DataHandler.iter_csv) are grouped into token-bounded chunks cut at
+        likely record boundaries, and the separated addresses of each chunk are yielded as soon as
+        that chunk's request returns. Addresses repeated across a chunk edge are yielded once.
+        """
+        def separated_chunks():
+            for chunk in chunk_rows(rows, max_tokens=max_chunk_tokens, overlap_rows=overlap_rows):
+                yield chunk, self.separate_addresses(chunk, version=version)
+
+        yield from dedupe_chunk_edges(separated_chunks())
+
+    def format_addresses(self, separated_addresses, version="v1", batch_size=None, token_budget=3000, executor=None):
+        """
+        Process separated addresses for formatting (Step 2, expect structured output).
+        With batch_size set, up to batch_size addresses are packed into each request.
+        With a local parser configured, only addresses it cannot parse confidently are sent to the model.
+        With a deduplicator configured, each canonical address is sent once and the result shared by its copies.
+        executor: A shared executor for the model calls, so concurrent callers together make at most
+        its max_workers requests at a time. By default each call opens an unbounded pool of its own.
+        """
+        local_results, remaining = self.parse_locally(separated_addresses)
+        if not remaining:
+            return local_results
+        if self.deduplicator is not None:
+            formatted = self.deduplicator.resolve(
+                remaining, lambda addresses: self.format_in_order(addresses, version, batch_size, token_budget, executor),
+                scope=(self.model, version))
+            return local_results + [result for result in formatted if result]
+        if batch_size and batch_size > 1:
+            return local_results + self.process_addresses_batched(remaining, 'format_addresses', version,
+                                                                  max_batch_size=batch_size, token_budget=token_budget,
+                                                                  executor=executor)
+        return local_results + self.process_addresses_parallel(remaining, 'format_addresses', version, executor)
+
+    def format_in_order(self, addresses, version="v1", batch_size=None, token_budget=3000, executor=None):
+        """Model results for addresses in input order, empty where one failed (what a deduplicator fans out)."""
+        if batch_size and batch_size > 1:
+            return self.batched_results(addresses, 'format_addresses', version, max_batch_size=batch_size,
+                                        token_budget=token_budget, executor=executor)
+        with self.call_executor(executor) as executor:
+            return list(executor.map(self.process_single_address, addresses, repeat('format_addresses'), repeat(version)))
+
+    def parse_locally(self, addresses):
+        """Run the local fast path. Returns (records parsed locally, addresses left for the model)."""
+        if self.local_parser is None:
+            return [], addresses
+        return self.local_parser.split(addresses)
 
     def clean_text_response(self, response_content):
         """Clean up the response to remove extra newlines and whitespace for Step 1."""
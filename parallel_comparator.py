@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fuzzywuzzy import fuzz
+from address_comparator import ComparatorIndex, normalize_record, field_scores, weighted_total
+from ground_truth_store import GroundTruthStore, build_store
+
+# State of a worker process, set up once by init_worker
+_worker = {}
+
+
+def init_worker(store_path, brute_force, index_options):
+    """Map the ground truth store; its normalized columns and blocking buckets are read from the shared page cache."""
+    store = GroundTruthStore(store_path)
+    _worker["store"] = store
+    _worker["index"] = None if brute_force else ComparatorIndex(store, **index_options)
+
+
+def score_candidates(processed_addr, match_threshold):
+    """
+    Yield (truth index, total score) for the candidates of one processed address whose postcode
+    scores above match_threshold, the rule of find_best_match and candidate_pairs.
+    """
+    store = _worker["store"]
+    index = _worker["index"]
+    processed = normalize_record(processed_addr)
+    candidate_indices = range(len(store)) if index is None else index.candidates(processed_addr)
+    for idx in candidate_indices:
+        truth = store.normalized(idx)
+        postcode_score = fuzz.ratio(processed['Postcode'], truth['Postcode'])
+        if postcode_score > match_threshold:
+            yield idx, weighted_total(field_scores(processed, truth, postcode_score))
+
+
+def best_matches_chunk(processed_addresses, match_threshold):
+    """Best (index, score) per processed address with the rules of find_best_match, (None, 0) if none qualifies."""
+    matches = []
+    for processed_addr in processed_addresses:
+        best_index, best_score = None, 0
+        for idx, total_score in score_candidates(processed_addr, match_threshold):
+            if total_score > best_score:
+                best_index, best_score = idx, total_score
+        matches.append((best_index, best_score))
+    return matches
+
+
+def candidate_pairs_chunk(processed_addresses, match_threshold):
+    """Eligible (position in chunk, truth index, score) pairs, as in AddressComparator.candidate_pairs."""
+    pairs = []
+    for position, processed_addr in enumerate(processed_addresses):
+        for idx, total_score in score_candidates(processed_addr, match_threshold):
+            if total_score >= match_threshold:
+                pairs.append((position, idx, total_score))
+    return pairs
+
+
+class ParallelScorer:
+    """
+    Multiprocessing version of the weighted scoring in AddressComparator.
+
+    Each worker process maps the ground truth as a GroundTruthStore: the file given, or one
+    compiled once into a temporary directory for a plain list. Its normalized columns and blocking
+    buckets are shared through the page cache, so the workers hold no copy of the ground truth or
+    its index (unless index_options ask for another ngram_size than the store's), and tasks only
+    carry a chunk of processed addresses and their results. Scores and tie-breaking are identical
+    to find_best_match, so reports do not change.
+
+    processes: Worker processes (defaults to the number of CPUs).
+    chunk_size: Processed addresses per task.
+    Call close() when done to stop the workers and remove the temporary store.
+    """
+
+    def __init__(self, ground_truth, processes=None, chunk_size=64, brute_force=False, **index_options):
+        self.ground_truth = ground_truth
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.store_directory = None
+        if isinstance(ground_truth, GroundTruthStore):
+            store_path = os.path.abspath(ground_truth.path)
+        else:
+            self.store_directory = tempfile.mkdtemp(prefix="ground_truth_")
+            store_path = os.path.join(self.store_directory, "ground_truth.gtstore")
+            build_store(ground_truth, store_path)
+        # spawn, not fork: the pipeline is multi-threaded and forking a threaded process is unsafe
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(store_path, brute_force, index_options)
+        )
+
+    def chunks(self, processed_addresses):
+        return [processed_addresses[start:start + self.chunk_size] for start in range(0, len(processed_addresses), self.chunk_size)]
+
+    def best_matches(self, processed_addresses, match_threshold=60):
+        """Best ground truth index and score for each processed address, (None, 0) where nothing qualifies."""
+        chunks = self.chunks(processed_addresses)
+        matches = []
+        for chunk_matches in self.executor.map(best_matches_chunk, chunks, [match_threshold] * len(chunks)):
+            matches.extend(chunk_matches)
+        return matches
+
+    def candidate_pairs(self, processed_addresses, match_threshold=60):
+        """All eligible {(processed position, truth index): score} pairs."""
+        chunks = self.chunks(processed_addresses)
+        pairs = {}
+        for chunk_number, chunk_pairs in enumerate(self.executor.map(candidate_pairs_chunk, chunks, [match_threshold] * len(chunks))):
+            for position, idx, score in chunk_pairs:
+                pairs[(chunk_number * self.chunk_size + position, idx)] = score
+        return pairs
+
+    def close(self):
+        self.executor.shutdown()
+        if self.store_directory is not None:
+            shutil.rmtree(self.store_directory, ignore_errors=True)
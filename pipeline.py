@@ -0,0 +1,144 @@
+import time
+import queue
+import threading
+
+# Put on a stage's queue once per worker to tell the workers there is no more input
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a StagedPipeline.
+
+    function: Called with each input item, returns an iterable of output items for the next stage
+    (empty to drop or hold back an item, several to fan out). A generator hands each output on as
+    soon as it is yielded.
+    workers: Threads running this stage.
+    queue_size: Capacity of the stage's input queue; a full queue blocks the previous stage.
+    """
+
+    def __init__(self, name, function, workers=1, queue_size=16):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_size = queue_size
+        self.processed = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.depth_samples = []
+        self.finished_workers = 0
+        self.lock = threading.Lock()
+
+
+class StagedPipeline:
+    """
+    Runs items through a chain of stages, each with its own worker threads and a bounded input
+    queue, so slow stages overlap with fast ones and backpressure keeps memory flat.
+
+    Queue depths are sampled every sample_interval seconds; stats() reports them per stage
+    together with the busy time of its workers, which shows where the bottleneck is. With
+    readout_interval set, the current depths are also printed every readout_interval seconds.
+    """
+
+    def __init__(self, stages, sample_interval=0.05, readout_interval=None):
+        self.stages = stages
+        self.sample_interval = sample_interval
+        self.readout_interval = readout_interval
+        self.outputs = []
+        self.outputs_lock = threading.Lock()
+        self.wall_time_s = 0.0
+
+    def run(self, items):
+        """Feed items to the first stage and return the outputs of the last stage once everything has drained."""
+        start = time.perf_counter()
+        threads = []
+        for position, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(position,), daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        sampling = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(sampling,), daemon=True)
+        sampler.start()
+
+        first = self.stages[0]
+        for item in items:
+            first.queue.put(item)
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        sampling.set()
+        sampler.join()
+        self.wall_time_s = time.perf_counter() - start
+        return self.outputs
+
+    def _work(self, position):
+        stage = self.stages[position]
+        next_stage = self.stages[position + 1] if position + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                break
+            # Busy time leaves out time spent blocked on a full downstream queue
+            busy_s = 0.0
+            started = time.perf_counter()
+            try:
+                for output in stage.function(item):
+                    busy_s += time.perf_counter() - started
+                    if next_stage is not None:
+                        next_stage.queue.put(output)
+                    else:
+                        with self.outputs_lock:
+                            self.outputs.append(output)
+                    started = time.perf_counter()
+            except Exception as e:
+                print(f"Error in pipeline stage {stage.name}: {str(e)}")
+                with stage.lock:
+                    stage.errors += 1
+            busy_s += time.perf_counter() - started
+            with stage.lock:
+                stage.processed += 1
+                stage.busy_s += busy_s
+
+        # The last worker of a stage to finish closes the next stage's input
+        with stage.lock:
+            stage.finished_workers += 1
+            last = stage.finished_workers == stage.workers
+        if last and next_stage is not None:
+            for _ in range(next_stage.workers):
+                next_stage.queue.put(_DONE)
+
+    def _sample(self, stop):
+        last_readout = time.perf_counter()
+        while not stop.wait(self.sample_interval):
+            for stage in self.stages:
+                stage.depth_samples.append(stage.queue.qsize())
+            if self.readout_interval and time.perf_counter() - last_readout >= self.readout_interval:
+                last_readout = time.perf_counter()
+                print("Queue depths: " + ", ".join(f"{stage.name} {stage.queue.qsize()}/{stage.queue_size}" for stage in self.stages))
+
+    def stats(self):
+        """Per stage: items processed, errors, busy time, utilization of its workers and input queue depth."""
+        stats = {}
+        for stage in self.stages:
+            samples = stage.depth_samples or [0]
+            stats[stage.name] = {
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "errors": stage.errors,
+                "busy_s": stage.busy_s,
+                "utilization": stage.busy_s / (stage.workers * self.wall_time_s) if self.wall_time_s else 0.0,
+                "queue_size": stage.queue_size,
+                "queue_depth_mean": sum(samples) / len(samples),
+                "queue_depth_max": max(samples)
+            }
+        return stats
+
+    def bottleneck(self):
+        """Name of the stage whose workers were busiest, relative to how many it has."""
+        stats = self.stats()
+        return max(stats, key=lambda name: stats[name]["utilization"]) if stats else None
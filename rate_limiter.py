@@ -0,0 +1,139 @@
+import time
+import random
+import asyncio
+import email.utils
+import openai
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at rate_per_minute.
+    Used both for requests (one unit per call) and for model tokens (estimated tokens per call).
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """Wait until amount units are available and take them. Waiters are served in arrival order."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta):
+        """Charge (positive) or refund (negative) units once the real cost of a call is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class RequestScheduler:
+    """
+    One scheduler shared by every file in a run, so the whole run respects a single
+    concurrency ceiling and the account's request and token rate limits.
+
+    max_concurrency: Maximum number of requests in flight at once.
+    requests_per_minute / tokens_per_minute: Rate limits enforced with token buckets.
+    max_retries: How many times a rate-limited or failed request is retried.
+    base_delay / max_delay: Bounds (seconds) for the jittered exponential backoff.
+    telemetry: An optional Telemetry that records every retry.
+    """
+
+    def __init__(self, max_concurrency=16, requests_per_minute=500, tokens_per_minute=200000,
+                 max_retries=6, base_delay=1.0, max_delay=60.0, telemetry=None):
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.telemetry = telemetry
+
+    def is_retryable(self, error):
+        """Rate limits, connection problems and server errors are worth retrying, as are errors flagged retryable (simulated 429s)."""
+        return (isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+                or getattr(error, "retryable", False))
+
+    def retry_after(self, error):
+        """Seconds the server asked us to wait (Retry-After / retry-after-ms headers), or None."""
+        response = getattr(error, "response", None)
+        if response is None:
+            return getattr(error, "retry_after", None)
+        headers = response.headers
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000.0
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            # Retry-After may also be an HTTP date
+            retry_date = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_date.timestamp() - time.time()) if retry_date else None
+
+    def backoff_delay(self, error, attempt):
+        """Full-jitter exponential backoff, never shorter than what the server asked for."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    async def run(self, make_request, estimated_tokens=0):
+        """
+        Run make_request (a coroutine function) under the rate limits and concurrency ceiling,
+        retrying retryable errors with backoff. Other errors, or the last failure, are raised.
+        """
+        attempt = 0
+        while True:
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimated_tokens)
+            async with self.semaphore:
+                self.requests += 1
+                try:
+                    return await make_request()
+                except Exception as e:
+                    if not self.is_retryable(e) or attempt >= self.max_retries:
+                        raise
+                    if isinstance(e, openai.RateLimitError) or getattr(e, "retryable", False):
+                        self.rate_limited += 1
+                    delay = self.backoff_delay(e, attempt)
+                    if self.telemetry is not None:
+                        self.telemetry.record_retry(e)
+            # Sleep outside the semaphore so waiting retries do not hold a concurrency slot
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the API reports what a call really cost."""
+        self.token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    def stats(self):
+        """Counters for the test report."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited
+        }
@@ -0,0 +1,115 @@
+import re
+import asyncio
+import threading
+from concurrent.futures import Future
+from local_parser import FIELD_DELIMITERS, STRIP_CHARACTERS
+
+# A UK postcode anywhere in a lowercased address, with or without the space before the inward code
+POSTCODE_IN_TEXT_PATTERN = re.compile(r'\b([a-z]{1,2}[0-9][a-z0-9]?)\s*([0-9][a-z]{2})\b')
+
+
+def canonical_address(address):
+    """
+    Key under which differently written copies of the same address are formatted once: fields split
+    on any delimiter, stripped of bullets and stray symbols and joined by single spaces (so delimiters
+    and plain whitespace are alike), lowercased, and UK postcodes written without their space.
+    "• JOHN SMITH | 221B Baker  Street | London | W1A 1AA | GB",
+    "John Smith, 221B Baker Street, London, W1A1AA, GB" and
+    "John Smith 221B Baker Street London W1A 1AA GB" share a key.
+    """
+    fields = (re.sub(r'\s+', ' ', field.strip().strip(STRIP_CHARACTERS + ".")).lower() for field in FIELD_DELIMITERS.split(address))
+    return POSTCODE_IN_TEXT_PATTERN.sub(r'\1\2', " ".join(field for field in fields if field))
+
+
+class RequestDeduplicator:
+    """
+    Sends each canonical address to the model once per run and scope (the model and prompt version
+    the result depends on, given by the caller).
+
+    The first caller to see a key formats it and publishes the result on a future; callers that
+    see the same key meanwhile wait on that future instead of sending their own request, and later
+    callers reuse the result. Failed results are forgotten so the next caller tries again.
+    Works across threads (resolve) or within one event loop (aresolve), not both at once.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.addresses = 0
+        self.sent = 0
+
+    def claim(self, addresses, make_future, scope=()):
+        """Split addresses into the ones this caller must format and the futures of every key."""
+        keys = [(scope, canonical_address(address)) for address in addresses]
+        owned = {}
+        with self._lock:
+            for key, address in zip(keys, addresses):
+                if key not in self._futures:
+                    self._futures[key] = make_future()
+                    owned[key] = address
+            futures = [self._futures[key] for key in keys]
+            self.addresses += len(addresses)
+            self.sent += len(owned)
+        return owned, futures
+
+    def settle(self, owned, results):
+        """Publish the results of the owned keys; failed ones are released for a retry."""
+        with self._lock:
+            for key, result in zip(owned, results):
+                future = self._futures[key]
+                if not result:
+                    del self._futures[key]
+                future.set_result(result)
+
+    def abandon(self, owned, error):
+        """Fail the owned keys with the error that stopped their caller, and release them."""
+        with self._lock:
+            for key in owned:
+                self._futures.pop(key).set_exception(error)
+
+    def resolve(self, addresses, process, scope=()):
+        """
+        Results for addresses, in order. process(addresses) formats the addresses this caller owns
+        and returns one result per address (empty for a failure). Duplicates get their own copy.
+        Only addresses resolved with the same scope share results.
+        """
+        owned, futures = self.claim(addresses, Future, scope)
+        if owned:
+            try:
+                results = process(list(owned.values()))
+            except Exception as e:
+                self.abandon(owned, e)
+                raise
+            self.settle(owned, results)
+        return self.fan_out([future.exception() or future.result() for future in futures])
+
+    async def aresolve(self, addresses, process, scope=()):
+        """resolve for coroutines: process is awaited and concurrent duplicates await the same future."""
+        owned, futures = self.claim(addresses, asyncio.get_running_loop().create_future, scope)
+        if owned:
+            try:
+                results = await process(list(owned.values()))
+            except Exception as e:
+                self.abandon(owned, e)
+                raise
+            self.settle(owned, results)
+        return self.fan_out(await asyncio.gather(*futures, return_exceptions=True))
+
+    def fan_out(self, results):
+        """One result per address; each duplicate gets its own copy, a request that raised becomes a failure."""
+        fanned_out = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error in deduplicated request: {str(result)}")
+                result = {}
+            fanned_out.append(dict(result) if result else result)
+        return fanned_out
+
+    def stats(self):
+        """Dedup counters for the test report."""
+        with self._lock:
+            return {
+                "addresses": self.addresses,
+                "sent": self.sent,
+                "dedup_ratio": self.addresses / self.sent if self.sent else 0.0
+            }
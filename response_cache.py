@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache of model responses backed by SQLite.
+
+    Entries are keyed by a hash of everything that influences a response (backend, base URL, model,
+    prompt, prompt version, user content, sampling params and schema) and evicted least recently
+    used first once the stored responses exceed max_bytes. The stored size is counted once on
+    open and kept up to date by put(), so it assumes one writer per cache file at a time.
+
+    Modes:
+        readwrite: Serve hits and store misses (default).
+        readonly:  Serve hits but never write.
+        refresh:   Never serve hits, overwrite entries with fresh responses.
+        bypass:    Do not touch the cache at all.
+    """
+
+    MODES = ("readwrite", "readonly", "refresh", "bypass")
+
+    def __init__(self, path='.cache/responses.sqlite', max_bytes=256 * 1024 * 1024, mode="readwrite"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {', '.join(self.MODES)}.")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+
+        if mode != "bypass":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # The processor calls the cache from many worker threads, all access goes through self._lock
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(**parts):
+        """Hash the request parts into a stable cache key."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss."""
+        if self.mode == "bypass":
+            return None
+        if self.mode == "refresh":
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode == "readwrite":
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+            return row[0]
+
+    def put(self, key, value):
+        """Store a response, evicting the least recently used entries if over max_bytes."""
+        if self.mode in ("readonly", "bypass"):
+            return
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            replaced = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._total_bytes += size - (replaced[0] if replaced else 0)
+            self.writes += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes. Caller holds the lock."""
+        while self._total_bytes > self.max_bytes:
+            oldest = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 64").fetchall()
+            if not oldest:
+                self._total_bytes = 0
+                break
+            for key, size in oldest:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """Return the hit/miss counters for the test report."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "mode": self.mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
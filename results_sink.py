@@ -0,0 +1,130 @@
+import os
+import csv
+import json
+import threading
+import importlib.util
+
+# Columns of the run dataset. "file" rows carry the per-file result, "difference" rows one field
+# difference of one compared address (field "Missing entry" for unmatched addresses or records).
+COLUMNS = ["filename", "record", "status", "reason", "differences", "field", "processed_value", "expected_value",
+           "match_score", "processed_address", "ground_truth"]
+
+
+def result_rows(result, comparison_report=None):
+    """Rows of the run dataset for one file's result and its comparison report."""
+    rows = [{
+        "filename": result["filename"],
+        "record": "file",
+        "status": result["status"],
+        "reason": result.get("reason"),
+        "differences": len(comparison_report) if comparison_report is not None else None
+    }]
+    for entry in comparison_report or []:
+        for difference in entry["differences"]:
+            rows.append({
+                "filename": result["filename"],
+                "record": "difference",
+                "status": result["status"],
+                "field": difference["field"],
+                "processed_value": difference["processed_value"],
+                "expected_value": difference["expected_value"],
+                "match_score": entry.get("match_score"),
+                "processed_address": entry["processed_address"],
+                "ground_truth": entry["ground_truth"]
+            })
+    return [{column: row.get(column) for column in COLUMNS} for row in rows]
+
+
+def flat_value(value):
+    """Records (dicts) are stored as JSON strings in the columnar formats."""
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def read_results(path):
+    """Lazily yield the rows of a JSON Lines run dataset (complete lines only, so a partial file can be read too)."""
+    with open(path, 'r', encoding='utf-8') as jsonlfile:
+        for line in jsonlfile:
+            if line.endswith("\n"):
+                yield json.loads(line)
+
+
+class ResultsSink:
+    """
+    One dataset for a whole run, written as files finish instead of after the run.
+
+    Rows (see COLUMNS) are appended to base_path.jsonl.partial and flushed after every file, so a
+    crash keeps every file finished so far. close() renames it to base_path.jsonl and writes the
+    other formats requested (csv, parquet) next to it, each through a temporary file and an atomic
+    rename, so readers never see a half-written dataset. Parquet needs the optional pyarrow package.
+    """
+
+    FORMATS = ("jsonl", "csv", "parquet")
+
+    def __init__(self, base_path, formats=("jsonl",)):
+        unknown_formats = set(formats) - set(self.FORMATS)
+        if unknown_formats:
+            raise ValueError(f"Unknown results format(s) {', '.join(sorted(unknown_formats))}, expected {', '.join(self.FORMATS)}.")
+        if "parquet" in formats:
+            # Fail before the run rather than after it
+            if importlib.util.find_spec("pyarrow") is None:
+                raise ImportError("Parquet results need the optional pyarrow package (pip install pyarrow).")
+        self.base_path = base_path
+        self.formats = formats
+        self.path = f"{base_path}.jsonl"
+        self.partial_path = f"{self.path}.partial"
+        os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+        self._file = open(self.partial_path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.filenames = set()
+        self.rows = 0
+
+    def add(self, result, comparison_report=None):
+        """Append a file's result and the differences in its comparison report."""
+        lines = "".join(json.dumps(row) + "\n" for row in result_rows(result, comparison_report))
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+            self.filenames.add(result["filename"])
+            self.rows += lines.count("\n")
+
+    def close(self):
+        """Finish the JSON Lines dataset and write the other formats. Returns the paths written."""
+        with self._lock:
+            self._file.close()
+            os.replace(self.partial_path, self.path)
+        paths = [self.path]
+        if "csv" in self.formats:
+            paths.append(self.write_csv(f"{self.base_path}.csv"))
+        if "parquet" in self.formats:
+            paths.append(self.write_parquet(f"{self.base_path}.parquet"))
+        return paths
+
+    def write_csv(self, path):
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in read_results(self.path):
+                writer.writerow({column: flat_value(value) for column, value in row.items()})
+        os.replace(temporary_path, path)
+        return path
+
+    def write_parquet(self, path):
+        import pyarrow as pa  # Optional: pip install pyarrow
+        import pyarrow.parquet as pq
+
+        # Values of a column can be numbers or strings (e.g. expected_value), so everything but the
+        # counts is stored as text
+        columns = {column: [] for column in COLUMNS}
+        for row in read_results(self.path):
+            for column, value in row.items():
+                value = flat_value(value)
+                if column not in ("differences", "match_score") and value is not None:
+                    value = str(value)
+                columns[column].append(value)
+        schema = pa.schema([(column, pa.int64() if column == "differences" else pa.float64() if column == "match_score" else pa.string())
+                            for column in COLUMNS])
+        temporary_path = f"{path}.tmp"
+        pq.write_table(pa.table(columns, schema=schema), temporary_path)
+        os.replace(temporary_path, path)
+        return path
@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import threading
+from collections import Counter
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    """sha256 of a file's contents, or None if it does not exist."""
+    try:
+        with open(path, 'rb') as file:
+            return hash_bytes(file.read())
+    except FileNotFoundError:
+        return None
+
+
+def hash_value(value):
+    """sha256 of a JSON-serializable value, independent of dict key order."""
+    return hash_bytes(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+
+class RunManifest:
+    """
+    Remembers what each input file's stored outputs were produced from, so unchanged work can be skipped.
+
+    Every file gets two keys:
+    - llm_key covers what Steps 1 and 2 depend on: the input file's contents and the run's llm_fingerprint
+      (model, prompt versions and texts, and settings such as batching or the local parser).
+    - compare_key covers what the comparison depends on: compare_fingerprint (ground truth hash,
+      comparator source and options).
+
+    plan() then picks "reuse" (both keys unchanged, stored result reused), "compare" (only the
+    comparison is re-run from the stored _step2.json) or "full".
+    """
+
+    PLANS = ("reuse", "compare", "full")
+
+    def __init__(self, path, llm_fingerprint, compare_fingerprint):
+        self.path = path
+        self.llm_fingerprint = hash_value(llm_fingerprint)
+        self.compare_key = hash_value(compare_fingerprint)
+        self.entries = self.load()
+        self.plans = Counter()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Entries of the previous run, {} if there is no (readable) manifest."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as jsonfile:
+                return json.load(jsonfile).get("files", {})
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, AttributeError):
+            print(f"Warning: Ignoring unreadable run manifest {self.path}.")
+            return {}
+
+    def keys(self, input_file):
+        """(llm_key, compare_key) for an input file."""
+        return hash_value([hash_file(input_file), self.llm_fingerprint]), self.compare_key
+
+    def plan(self, filename, llm_key, compare_key, step2_output_file, comparison_results_file):
+        """Decide how much of a file has to be recomputed, based on its entry and the outputs on disk."""
+        with self._lock:
+            entry = self.entries.get(filename)
+        plan = "full"
+        if entry and entry["llm_key"] == llm_key and os.path.exists(step2_output_file):
+            plan = "compare"
+            if entry["compare_key"] == compare_key and os.path.exists(comparison_results_file):
+                plan = "reuse"
+        with self._lock:
+            self.plans[plan] += 1
+        return plan
+
+    def result(self, filename):
+        """The stored result of a file's last run."""
+        with self._lock:
+            return dict(self.entries[filename]["result"], reused=True)
+
+    def record(self, filename, llm_key, compare_key, result):
+        """
+        Store the keys and result of a file that made it through the comparison.
+        Files that failed earlier are not recorded, so they are retried on the next run.
+        """
+        if "comparison_stats" not in result:
+            with self._lock:
+                self.entries.pop(filename, None)
+            return
+        with self._lock:
+            self.entries[filename] = {"llm_key": llm_key, "compare_key": compare_key, "result": result}
+
+    def save(self):
+        """Write the manifest atomically (temporary file, then rename)."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"files": self.entries}
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as jsonfile:
+            json.dump(data, jsonfile, indent=4)
+        os.replace(temporary_path, self.path)
+
+    def stats(self):
+        """How many files were reused, compared only or fully processed, for the test report."""
+        with self._lock:
+            return {plan: self.plans[plan] for plan in self.PLANS}
@@ -0,0 +1,193 @@
+import os
+import csv
+import json
+import math
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+# USD per million tokens (input, output), used for the cost estimate
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(values):
+    """Count, total, mean and p50/p95/p99 of a list of durations in seconds."""
+    return {
+        "count": len(values),
+        "total_s": sum(values),
+        "mean_s": sum(values) / len(values) if values else 0.0,
+        "p50_s": percentile(values, 0.50),
+        "p95_s": percentile(values, 0.95),
+        "p99_s": percentile(values, 0.99),
+        "max_s": max(values) if values else 0.0
+    }
+
+
+class Telemetry:
+    """
+    Collects run-level timings: per-stage durations of each file, per-call model latency,
+    token usage from response.usage, retries and an estimated cost. Safe to share across threads.
+
+    profiler: Optional "cprofile" or "pyinstrument"; stages wrapped in profile() are then profiled
+    and written to profile_dir.
+    """
+
+    PROFILERS = ("cprofile", "pyinstrument")
+
+    def __init__(self, profiler=None, profile_dir='output_data/profiles'):
+        if profiler not in (None,) + self.PROFILERS:
+            raise ValueError(f"Unknown profiler '{profiler}', expected one of {', '.join(self.PROFILERS)}.")
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.started = time.perf_counter()
+        self.stage_durations = defaultdict(list)  # stage -> [seconds]
+        self.file_stages = defaultdict(dict)  # filename -> {stage: seconds}
+        self.calls = []  # One dict per model call
+        self.retries = defaultdict(int)  # error type -> count
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, filename=None):
+        """Time a pipeline stage, optionally attributed to a file."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stage_durations[name].append(elapsed)
+                if filename is not None:
+                    self.file_stages[filename][name] = self.file_stages[filename].get(name, 0.0) + elapsed
+
+    @contextmanager
+    def profile(self, name):
+        """Profile the wrapped block with the configured profiler; a no-op when none is configured."""
+        if self.profiler is None:
+            yield
+            return
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler  # Optional: pip install pyinstrument
+
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(os.path.join(self.profile_dir, f"{name}.html"), 'w', encoding='utf-8') as htmlfile:
+                    htmlfile.write(profiler.output_html())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+    def record_call(self, prompt_type, model, latency, usage=None, cached=False, error=None, queue_wait=0.0):
+        """
+        Record one model call. usage is the dict from llm_backends.response_usage (None if unknown).
+        latency covers the API call itself; queue_wait is the time spent before it on rate limits,
+        the concurrency ceiling and retry backoff.
+        """
+        prompt_tokens = usage["prompt_tokens"] if usage else 0
+        completion_tokens = usage["completion_tokens"] if usage else 0
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        with self._lock:
+            self.calls.append({
+                "prompt_type": prompt_type,
+                "model": model,
+                "latency_s": latency,
+                "queue_wait_s": queue_wait,
+                "cached": cached,
+                "error": error,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+            })
+
+    def record_retry(self, error):
+        """Record a retried call, keyed by the error type."""
+        with self._lock:
+            self.retries[type(error).__name__] += 1
+
+    def summary(self):
+        """Machine-readable summary of the run."""
+        with self._lock:
+            calls = list(self.calls)
+            stage_durations = {name: list(values) for name, values in self.stage_durations.items()}
+            file_stages = {filename: dict(stages) for filename, stages in self.file_stages.items()}
+            retries = dict(self.retries)
+
+        calls_by_type = defaultdict(list)
+        for call in calls:
+            calls_by_type[call["prompt_type"]].append(call)
+
+        return {
+            "wall_time_s": time.perf_counter() - self.started,
+            "stages": {name: latency_summary(values) for name, values in stage_durations.items()},
+            "files": file_stages,
+            "calls": {
+                prompt_type: dict(
+                    latency_summary([call["latency_s"] for call in type_calls if not call["cached"]]),
+                    queue_wait=latency_summary([call["queue_wait_s"] for call in type_calls if not call["cached"]]),
+                    # Calls sent to the model; the ones served from the response cache are counted apart
+                    requests=sum(1 for call in type_calls if not call["cached"]),
+                    cached=sum(1 for call in type_calls if call["cached"]),
+                    errors=sum(1 for call in type_calls if call["error"]),
+                    prompt_tokens=sum(call["prompt_tokens"] for call in type_calls),
+                    completion_tokens=sum(call["completion_tokens"] for call in type_calls),
+                    cost_usd=sum(call["cost_usd"] for call in type_calls)
+                )
+                for prompt_type, type_calls in calls_by_type.items()
+            },
+            "retries": retries,
+            "totals": {
+                "requests": sum(1 for call in calls if not call["cached"]),
+                "cached": sum(1 for call in calls if call["cached"]),
+                "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+                "completion_tokens": sum(call["completion_tokens"] for call in calls),
+                "cost_usd": sum(call["cost_usd"] for call in calls),
+                "retries": sum(retries.values())
+            }
+        }
+
+    def write(self, base_path):
+        """Write the summary to base_path.json and a flat per-stage / per-call-type table to base_path.csv."""
+        summary = self.summary()
+        directory = os.path.dirname(base_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(f"{base_path}.json", 'w', encoding='utf-8') as jsonfile:
+            json.dump(summary, jsonfile, indent=4)
+
+        columns = ["kind", "name", "count", "total_s", "mean_s", "p50_s", "p95_s", "p99_s", "max_s",
+                   "queue_wait_p50_s", "queue_wait_p95_s", "requests", "cached", "errors", "prompt_tokens",
+                   "completion_tokens", "cost_usd"]
+        with open(f"{base_path}.csv", 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            for name, stats in summary["stages"].items():
+                writer.writerow(dict(stats, kind="stage", name=name))
+            for name, stats in summary["calls"].items():
+                writer.writerow(dict(stats, kind="call", name=name, queue_wait_p50_s=stats["queue_wait"]["p50_s"],
+                                     queue_wait_p95_s=stats["queue_wait"]["p95_s"]))
+        return summary
@@ -0,0 +1,36 @@
+from address_chunker import chunk_rows, dedupe_chunk_edges
+
+HEADER = "FirstName,LastName,StreetName,Town,Postcode,Country"
+
+
+def separate(chunk):
+    """Stand-in for the separation request: one address per row, header dropped."""
+    return [row for row in chunk if row != HEADER]
+
+
+def separated(chunks):
+    return [address for addresses in dedupe_chunk_edges((chunk, separate(chunk)) for chunk in chunks) for address in addresses]
+
+
+def test_identical_records_either_side_of_a_boundary_cut_are_kept():
+    rows = ["John Smith, 221B Baker Street, London, W1A 1AA, GB"] * 12
+    chunks = list(chunk_rows([HEADER] + rows, max_tokens=40))
+    assert len(chunks) > 1
+    assert not any(chunk.carried_rows for chunk in chunks)
+    assert separated(chunks) == rows
+
+
+def test_rows_carried_over_a_forced_cut_are_dropped_once():
+    # No postcodes, so no record boundary is found and every cut is forced
+    rows = [f"Person{i} Smith, {i} High Street, London" for i in range(12)]
+    chunks = list(chunk_rows(rows, max_tokens=40, overlap_rows=2))
+    assert len(chunks) > 1
+    assert all(chunk.carried_rows for chunk in chunks[1:])
+    assert separated(chunks) == rows
+
+
+def test_identical_records_carried_over_a_forced_cut_are_kept():
+    rows = ["John Smith, 221B Baker Street, London"] * 12
+    chunks = list(chunk_rows(rows, max_tokens=40, overlap_rows=2))
+    assert len(chunks) > 1
+    assert separated(chunks) == rows
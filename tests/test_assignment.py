@@ -0,0 +1,55 @@
+import io
+import contextlib
+import importlib.util
+import pytest
+from address_comparator import AddressComparator
+
+pytest.importorskip("scipy")
+pytest.importorskip("numpy")
+
+
+def address(postcode):
+    return {"FirstName": "John", "LastName": "Smith", "StreetName": "1 High Street", "Town": "London",
+            "Postcode": postcode, "Country": "GB"}
+
+
+# The first processed address is closest to record 0 but also qualifies for record 1; the second
+# only qualifies for record 0. Greedy hands record 0 to the first and leaves the second unmatched.
+GROUND_TRUTH = [address("W1A 1AA"), address("W1X 1XX")]
+PROCESSED = [address("W1A 1XA"), address("W1A 1AA")]
+
+ENGINES = [
+    pytest.param({}, id="index"),
+    pytest.param({"brute_force": True}, id="brute_force"),
+    pytest.param({"bulk": True}, id="bulk", marks=pytest.mark.skipif(
+        importlib.util.find_spec("rapidfuzz") is None, reason="bulk scoring needs rapidfuzz")),
+]
+
+
+def compare(assignment, options):
+    stats = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = AddressComparator(assignment=assignment, **options).compare(PROCESSED, GROUND_TRUTH, stats=stats)
+    return report, stats
+
+
+@pytest.mark.parametrize("options", ENGINES)
+def test_greedy_leaves_the_second_address_unmatched(options):
+    report, stats = compare("greedy", options)
+    unmatched = [entry["processed_address"] for entry in report if entry["ground_truth"] is None]
+    unmatched_truth = [entry["ground_truth"] for entry in report if entry["processed_address"] is None]
+    assert unmatched == [PROCESSED[1]]
+    assert unmatched_truth == [GROUND_TRUTH[1]]
+    assert "assignment_changes" not in stats
+
+
+@pytest.mark.parametrize("options", ENGINES)
+def test_optimal_matches_both_addresses(options):
+    report, stats = compare("optimal", options)
+    assert all(entry["processed_address"] is not None and entry["ground_truth"] is not None for entry in report)
+    # The exact copy of record 0 has no differences; the other address only differs in its postcode
+    assert [(entry["processed_address"], entry["ground_truth"]) for entry in report] == [(PROCESSED[0], GROUND_TRUTH[1])]
+    assert stats["assignment_changes"] == [
+        {"processed_address": PROCESSED[0], "greedy_truth_index": 0, "optimal_truth_index": 1},
+        {"processed_address": PROCESSED[1], "greedy_truth_index": None, "optimal_truth_index": 0}
+    ]
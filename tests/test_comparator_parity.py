@@ -0,0 +1,85 @@
+import io
+import os
+import random
+import contextlib
+import pytest
+from data_handler import DataHandler
+from address_comparator import AddressComparator, ComparatorIndex
+from ground_truth_store import build_store, GroundTruthStore
+from benchmark_comparator import synthesize_ground_truth, perturb, check_score_parity
+
+pytest.importorskip("rapidfuzz")
+pytest.importorskip("numpy")
+# fuzzywuzzy only rounds like rapidfuzz when it runs on python-Levenshtein
+pytest.importorskip("Levenshtein")
+
+GROUND_TRUTH_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ground_truth.json')
+
+
+def garble(value):
+    """Every other character replaced by a digit: still similar, but no n-gram left in common."""
+    return "".join(char if position % 2 == 0 else str(position % 10) for position, char in enumerate(value))
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = random.Random(7)
+    base = DataHandler().read_json(GROUND_TRUTH_FILE)
+    ground_truth = synthesize_ground_truth(base, 1000, rng)
+    processed = [perturb(ground_truth[rng.randrange(len(ground_truth))], rng) for _ in range(150)]
+    # Some untouched copies, so exact matches and ties are covered too
+    processed += [dict(ground_truth[rng.randrange(len(ground_truth))]) for _ in range(50)]
+    # Postcode typos with nothing else to block on: garbled last name, no street
+    for truth in (ground_truth[rng.randrange(len(ground_truth))] for _ in range(30)):
+        processed.append(dict(perturb(truth, rng, fields=["Postcode"]), LastName=garble(truth["LastName"]), StreetName=""))
+    return base, ground_truth, processed
+
+
+def compare(comparator, processed, ground_truth):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return comparator.compare(processed, ground_truth)
+
+
+def test_bulk_scores_match_pairwise_scores(data):
+    base, _, _ = data
+    rng = random.Random(11)
+    processed = [perturb(record, rng) for record in base]
+    pairs, max_difference, mismatches = check_score_parity(base, processed)
+    assert pairs == len(base) * len(processed)
+    assert mismatches == 0, f"max difference {max_difference}"
+
+
+@pytest.mark.parametrize("options", [{}, {"bulk": True}, {"processes": 2}], ids=["index", "bulk", "parallel"])
+def test_engines_report_the_same_as_brute_force(data, options):
+    _, ground_truth, processed = data
+    reference = compare(AddressComparator(brute_force=True), processed, ground_truth)
+    comparator = AddressComparator(**options)
+    try:
+        assert compare(comparator, processed, ground_truth) == reference
+    finally:
+        comparator.close()
+
+
+def test_store_buckets_match_the_in_memory_index(data, tmp_path):
+    _, ground_truth, processed = data
+    path = str(tmp_path / "ground_truth.gtstore")
+    build_store(ground_truth, path)
+    store = GroundTruthStore(path)
+    try:
+        index = ComparatorIndex(ground_truth)
+        store_index = ComparatorIndex(store)
+        assert store_index.store is store
+        assert [store_index.candidates(addr) for addr in processed] == [index.candidates(addr) for addr in processed]
+        assert compare(AddressComparator(), processed, store) == compare(AddressComparator(), processed, ground_truth)
+    finally:
+        store.close()
+
+
+def test_index_blocks_on_the_inward_code(data):
+    base, _, _ = data
+    # Outward code typo, garbled last name and no street: only the inward code is left to block on
+    processed = [{"FirstName": "Hannah", "LastName": "E1dar", "StreetName": "", "Town": "Preston", "Postcode": "PR1 12CD",
+                  "Country": "GB"}]
+    report = compare(AddressComparator(), processed, base)
+    assert report == compare(AddressComparator(brute_force=True), processed, base)
+    assert report[0]["ground_truth"]["LastName"] == "Edwards"
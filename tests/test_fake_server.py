@@ -0,0 +1,43 @@
+import os
+import random
+import asyncio
+import pytest
+from fake_openai_server import start_server
+from async_openai_processor import AsyncOpenAIProcessor
+from rate_limiter import RequestScheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADDRESSES = [f"Person{i} Smith{i}, {i} High Street, London, W1A {i % 10}AA, GB" for i in range(20)]
+
+
+@pytest.fixture
+def server():
+    random.seed(3)
+    # Port 0: any free port
+    server = start_server(port=0, latency=0.01, latency_jitter=0.0, rate_limit_rate=0.5, retry_after=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_processor_retries_rate_limits_from_fake_server(server, monkeypatch):
+    # Prompts are loaded relative to the repository root
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    scheduler = RequestScheduler(max_concurrency=8, requests_per_minute=100000, tokens_per_minute=100000000,
+                                 max_retries=30, base_delay=0.001, max_delay=0.01)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    async def run():
+        processor = AsyncOpenAIProcessor(scheduler=scheduler, base_url=base_url)
+        return await processor.format_addresses(ADDRESSES)
+
+    formatted = asyncio.run(run())
+
+    stats = scheduler.stats()
+    assert server.rate_limited > 0
+    assert stats["rate_limited"] == server.rate_limited
+    assert stats["retries"] == server.rate_limited
+    assert stats["requests"] == len(ADDRESSES) + server.rate_limited
+    assert sorted(record["FirstName"] for record in formatted) == sorted(f"Person{i}" for i in range(20))
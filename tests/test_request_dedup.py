@@ -0,0 +1,72 @@
+import pytest
+from request_dedup import RequestDeduplicator, canonical_address
+
+RECORD = {"FirstName": "John", "LastName": "Smith", "StreetName": "221B Baker Street", "Town": "London",
+          "Postcode": "W1A 1AA", "Country": "GB"}
+
+
+class Formatter:
+    """process callback for resolve: records what it was asked to format and answers with results."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.batches = []
+
+    def __call__(self, addresses):
+        self.batches.append(addresses)
+        return [self.results.pop(0) for _ in addresses]
+
+
+def test_delimited_and_whitespace_forms_share_a_key():
+    assert canonical_address("• JOHN SMITH | 221B Baker  Street | London | W1A 1AA | GB") == \
+        canonical_address("John Smith 221B Baker Street London W1A 1AA GB") == \
+        canonical_address("John Smith, 221B Baker Street, London, W1A 1AA, GB")
+
+
+def test_postcode_spacing_shares_a_key():
+    assert canonical_address("John Smith, 221B Baker Street, London, W1A1AA, GB") == \
+        canonical_address("John Smith, 221B Baker Street, London, W1A 1AA, GB")
+    assert canonical_address("John Smith, London, W1A 1AA") != canonical_address("John Smith, London, W1A 1AB")
+
+
+def test_copies_are_formatted_once():
+    deduplicator = RequestDeduplicator()
+    formatter = Formatter(RECORD)
+    results = deduplicator.resolve(["John Smith, 221B Baker Street, London, W1A1AA, GB",
+                                    "john smith 221b baker street london w1a 1aa gb"], formatter)
+    assert results == [RECORD, RECORD]
+    assert results[0] is not results[1]
+    assert len(formatter.batches) == 1
+    assert deduplicator.stats() == {"addresses": 2, "sent": 1, "dedup_ratio": 2.0}
+
+
+def test_scopes_do_not_share_results():
+    deduplicator = RequestDeduplicator()
+    address = "John Smith, 221B Baker Street, London, W1A 1AA, GB"
+    v1 = Formatter(RECORD)
+    v2 = Formatter(dict(RECORD, Town="LONDON"))
+    assert deduplicator.resolve([address], v1, scope=("gpt-4o-mini", "v1")) == [RECORD]
+    assert deduplicator.resolve([address], v2, scope=("gpt-4o-mini", "v2")) == [dict(RECORD, Town="LONDON")]
+    assert deduplicator.resolve([address], Formatter(), scope=("gpt-4o-mini", "v1")) == [RECORD]
+    assert len(v1.batches) == len(v2.batches) == 1
+
+
+def test_failed_results_are_released_for_a_retry():
+    deduplicator = RequestDeduplicator()
+    address = "John Smith, 221B Baker Street, London, W1A 1AA, GB"
+    assert deduplicator.resolve([address], Formatter({})) == [{}]
+    retry = Formatter(RECORD)
+    assert deduplicator.resolve([address], retry) == [RECORD]
+    assert retry.batches == [[address]]
+
+
+def test_a_raising_caller_releases_its_keys():
+    deduplicator = RequestDeduplicator()
+    address = "John Smith, 221B Baker Street, London, W1A 1AA, GB"
+
+    def fail(addresses):
+        raise RuntimeError("API down")
+
+    with pytest.raises(RuntimeError):
+        deduplicator.resolve([address], fail)
+    assert deduplicator.resolve([address], Formatter(RECORD)) == [RECORD]
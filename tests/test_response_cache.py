@@ -0,0 +1,118 @@
+import os
+import json
+import pytest
+from types import SimpleNamespace
+from response_cache import ResponseCache
+from openai_processor import OpenAIProcessor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADDRESS = "John Smith, 221B Baker Street, London, W1A 1AA, GB"
+RECORD = {"FirstName": "John", "LastName": "Smith", "StreetName": "221B Baker Street", "Town": "London",
+          "Postcode": "W1A 1AA", "Country": "GB"}
+
+
+class StubClient:
+    """OpenAI client stand-in answering chat completions with the given replies, the last one repeatedly."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **params):
+        reply = self.replies[min(self.calls, len(self.replies) - 1)]
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+                               usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+
+
+@pytest.fixture(autouse=True)
+def repository_root(monkeypatch):
+    # Prompts are loaded relative to the repository root
+    monkeypatch.chdir(ROOT)
+
+
+def format_address(client, cache, address=ADDRESS):
+    return OpenAIProcessor(client=client, cache=cache).process_single_address(address, 'format_addresses', 'v1')
+
+
+def test_readwrite_serves_hits_and_stores_misses(tmp_path):
+    client = StubClient(json.dumps(RECORD))
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    assert format_address(client, cache) == RECORD
+    assert format_address(client, cache) == RECORD
+    assert client.calls == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1 and cache.stats()["writes"] == 1
+
+
+def test_invalid_responses_are_not_cached(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    client = StubClient('{"FirstName": "Jo', json.dumps({"FirstName": "John"}), json.dumps(RECORD))
+    assert format_address(client, ResponseCache(path)) == {}
+    assert format_address(client, ResponseCache(path)) == {"FirstName": "John"}
+    assert format_address(client, ResponseCache(path)) == RECORD
+    assert format_address(client, ResponseCache(path)) == RECORD
+    assert client.calls == 3
+
+
+def test_batch_with_wrong_item_count_is_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    addresses = [ADDRESS, "Jane Doe, 12 High Street, Manchester, M1 2AB, GB"]
+    client = StubClient(json.dumps({"addresses": [RECORD]}))
+    processor = OpenAIProcessor(client=client, cache=cache)
+    processor.process_address_batch(addresses, 'format_addresses', 'v1')
+    processor.process_address_batch(addresses, 'format_addresses', 'v1')
+    assert client.calls == 2
+    assert cache.stats()["writes"] == 0
+
+
+def test_readonly_serves_hits_but_never_writes(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    format_address(StubClient(json.dumps(RECORD)), ResponseCache(path))
+    cache = ResponseCache(path, mode="readonly")
+    client = StubClient(json.dumps(RECORD))
+    assert format_address(client, cache) == RECORD
+    format_address(client, cache, "Jane Doe, 12 High Street, Manchester, M1 2AB, GB")
+    assert client.calls == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["writes"] == 0
+
+
+def test_refresh_never_serves_hits_and_overwrites(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    format_address(StubClient(json.dumps(dict(RECORD, Town="Londn"))), ResponseCache(path))
+    client = StubClient(json.dumps(RECORD))
+    assert format_address(client, ResponseCache(path, mode="refresh")) == RECORD
+    assert client.calls == 1
+    assert format_address(StubClient(json.dumps({})), ResponseCache(path)) == RECORD
+
+
+def test_bypass_does_not_touch_the_cache(tmp_path):
+    path = tmp_path / "responses.sqlite"
+    client = StubClient(json.dumps(RECORD))
+    cache = ResponseCache(str(path), mode="bypass")
+    format_address(client, cache)
+    format_address(client, cache)
+    assert client.calls == 2
+    assert not path.exists()
+
+
+def test_eviction_drops_least_recently_used_entries(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = ResponseCache(path, max_bytes=25)
+    for key in ("a", "b", "c"):
+        cache.put(key, "x" * 10)
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("a") is None and cache.get("b") is not None
+    # "b" was read last, so "c" goes next
+    cache.put("d", "x" * 10)
+    assert cache.get("c") is None and cache.get("b") is not None
+    # Replacing an entry counts its new size only, and the total is restored on reopening
+    cache.put("d", "x" * 10)
+    assert cache.stats()["evictions"] == 2
+    cache.close()
+    reopened = ResponseCache(path, max_bytes=25)
+    reopened.put("e", "x" * 5)
+    assert reopened.stats()["evictions"] == 0
+    reopened.put("f", "x" * 1)
+    assert reopened.stats()["evictions"] == 1